@@ -0,0 +1,121 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Benchmark exporting a large synthetic data package.
+
+Run with ``python benchmarks/bench_export.py``. The benchmark fills the
+logical data package of the empty test model with ``N_PACKAGES``
+packages of ``N_CLASSES`` classes and ``N_ENUMS`` enumerations each,
+then times :func:`capella_ros_tools.exporter.export` into a fresh
+directory.
+"""
+
+import io
+import logging
+import pathlib
+import random
+import tempfile
+import time
+
+import capellambse
+from capellambse import decl, helpers
+
+from capella_ros_tools import exporter
+
+MODEL_PATH = pathlib.Path(__file__).parents[1] / "tests/data/empty_project_60"
+N_PACKAGES = 20
+N_CLASSES = 50
+N_ENUMS = 10
+N_PROPERTIES = 15
+N_LITERALS = 8
+TYPES = ["uint8", "int32", "float64", "string", "bool"]
+CARDS = [("1", "1"), ("0", "*"), ("3", "3"), ("0", "10")]
+
+
+def _value(value: str) -> decl.NewObject:
+    return decl.NewObject("LiteralNumericValue", value=value)
+
+
+def _build_model() -> capellambse.MelodyModel:
+    rng = random.Random(0)
+    model = capellambse.MelodyModel(MODEL_PATH)
+    packages = []
+    for i in range(N_PACKAGES):
+        classes = []
+        for j in range(N_CLASSES):
+            properties = []
+            for k in range(N_PROPERTIES):
+                min_card, max_card = rng.choice(CARDS)
+                properties.append(
+                    {
+                        "name": f"field_{k}",
+                        "description": f"Field {k} of class {j}.",
+                        "type": decl.Promise(rng.choice(TYPES)),
+                        "kind": "COMPOSITION",
+                        "min_card": _value(min_card),
+                        "max_card": _value(max_card),
+                    }
+                )
+            classes.append(
+                {
+                    "name": f"Class{j}",
+                    "description": f"Class {j} of package {i}.",
+                    "properties": properties,
+                }
+            )
+        enums = [
+            {
+                "name": f"Enum{j}",
+                "description": f"Enum {j} of package {i}.",
+                "literals": [
+                    {"name": f"LITERAL_{k}", "value": _value(str(k))}
+                    for k in range(N_LITERALS)
+                ],
+            }
+            for j in range(N_ENUMS)
+        ]
+        packages.append(
+            {"name": f"package_{i}", "classes": classes, "enumerations": enums}
+        )
+
+    datatypes = [
+        {"promise_id": name, "_type": "NumericType", "name": name}
+        for name in TYPES
+    ]
+    instructions = [
+        {
+            "parent": decl.UUIDReference(
+                helpers.UUIDString(model.sa.data_package.uuid)
+            ),
+            "extend": {"datatypes": datatypes},
+        },
+        {
+            "parent": decl.UUIDReference(
+                helpers.UUIDString(model.la.data_package.uuid)
+            ),
+            "extend": {"packages": packages},
+        },
+    ]
+    decl.apply(model, io.StringIO(decl.dump(instructions)))
+    return model
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    model = _build_model()
+    n_classes = len(model.search("Class"))
+    n_enums = len(model.search("Enumeration"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        exporter.export(model.la.data_package, pathlib.Path(tmp))
+        elapsed = time.perf_counter() - start
+        n_files = len(list(pathlib.Path(tmp).rglob("*.msg")))
+
+    print(f"classes:      {n_classes}")
+    print(f"enumerations: {n_enums}")
+    print(f"files:        {n_files}")
+    print(f"export:       {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
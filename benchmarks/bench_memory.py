@@ -0,0 +1,99 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Benchmark the memory footprint of a large parsed message tree.
+
+Run with ``python benchmarks/bench_memory.py``. The peak RSS is only
+meaningful for a fresh process, so the benchmark parses the tree once.
+Pass ``--tracemalloc`` to additionally report the memory retained by the
+parsed tree; tracing inflates the peak RSS considerably.
+"""
+
+import gc
+import pathlib
+import random
+import resource
+import sys
+import tempfile
+import tracemalloc
+
+from capella_ros_tools import data_model
+
+N_PACKAGES = 100
+N_MESSAGES = 100
+TYPES = [
+    "bool",
+    "uint8",
+    "int32",
+    "uint32",
+    "float32",
+    "float64",
+    "string",
+    "uint8[]",
+    "float64[9]",
+    "std_msgs/Header",
+    "geometry_msgs/Pose",
+]
+DESCRIPTIONS = [
+    "Timestamp of the measurement.",
+    "Frame this data is associated with.",
+    "Covariance of the measurement, row major.",
+    "Unit is meters.",
+    "Unit is radians.",
+]
+
+
+def _write_tree(root: pathlib.Path) -> None:
+    rng = random.Random(0)
+    for i in range(N_PACKAGES):
+        msg_dir = root / f"package_{i}" / "msg"
+        msg_dir.mkdir(parents=True)
+        for j in range(N_MESSAGES):
+            lines = [f"# Message {j} of package {i}.", ""]
+            lines.extend(
+                [
+                    "uint8 STATE_UNKNOWN = 0",
+                    "uint8 STATE_OK = 1",
+                    "uint8 STATE_ERROR = 2",
+                    "",
+                    "uint8 state",
+                ]
+            )
+            for k in range(15):
+                lines.append(f"# {rng.choice(DESCRIPTIONS)}")
+                lines.append(f"{rng.choice(TYPES)} field_{k}")
+            msg_dir.joinpath(f"Message{j}.msg").write_text("\n".join(lines))
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        _write_tree(root)
+        gc.collect()
+
+        trace = "--tracemalloc" in sys.argv
+        if trace:
+            tracemalloc.start()
+        tree = data_model.MessagePkgDef("root", [], [])
+        for msg_dir in sorted(root.glob("*/msg")):
+            tree.packages.append(
+                data_model.MessagePkgDef.from_msg_folder(
+                    msg_dir.parent.name, msg_dir
+                )
+            )
+        gc.collect()
+        if trace:
+            retained, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    n_messages = sum(len(p.messages) for p in tree.packages)
+    print(f"messages parsed:  {n_messages}")
+    if trace:
+        print(f"retained by tree: {retained / 2**20:8.1f} MiB")
+    print(f"peak RSS:         {peak_rss / 2**20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
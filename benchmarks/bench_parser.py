@@ -0,0 +1,63 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Benchmark parsing of large, heavily commented messages.
+
+Run with ``python benchmarks/bench_parser.py``.
+"""
+
+import timeit
+
+from capella_ros_tools import data_model
+
+COMMENT = "# " + "Lorem ipsum dolor sit amet, consectetur adipiscing. " * 2
+
+
+def _block_commented(n_fields: int, n_comment_lines: int) -> str:
+    lines = []
+    for i in range(n_fields):
+        lines.extend([COMMENT] * n_comment_lines)
+        lines.append(f"uint8 field{i}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _inline_commented(n_fields: int, n_comment_lines: int) -> str:
+    lines = []
+    for i in range(n_fields):
+        lines.append(f"uint8 field{i}    {COMMENT}")
+        lines.extend([f"                 {COMMENT}"] * n_comment_lines)
+    return "\n".join(lines)
+
+
+def _enum(n_literals: int, n_comment_lines: int) -> str:
+    lines = []
+    for i in range(n_literals):
+        lines.extend([COMMENT] * n_comment_lines)
+        lines.append(f"uint16 STATE_VALUE_{i} = {i}    {COMMENT}")
+    return "\n".join(lines)
+
+
+CASES = {
+    "block comments (100 fields x 200 lines)": _block_commented(100, 200),
+    "long block comment (1 field x 20000 lines)": _block_commented(1, 20000),
+    "inline comments (100 fields x 200 lines)": _inline_commented(100, 200),
+    "long inline comment (1 field x 20000 lines)": _inline_commented(1, 20000),
+    "enum (2000 literals x 5 lines)": _enum(2000, 5),
+}
+
+
+def main() -> None:
+    for name, msg_string in CASES.items():
+        timer = timeit.Timer(
+            lambda msg_string=msg_string: data_model.MessageDef.from_string(
+                "BenchMessage", msg_string
+            )
+        )
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        size = len(msg_string) // 1024
+        print(f"{name:<45} {size:>6} KiB {best * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
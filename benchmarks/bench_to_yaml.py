@@ -0,0 +1,100 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Benchmark how Importer.to_yaml scales with the number of fields.
+
+Run with ``python benchmarks/bench_to_yaml.py``. For each size, a
+synthetic workspace with ``FIELDS_PER_MESSAGE`` fields per message and
+``MESSAGES_PER_PACKAGE`` messages per package is converted. A third of
+the fields reference other messages, a third primitive types and a third
+distinct messages outside of the workspace, which become data types.
+The conversion into decl instructions and the YAML serialization are
+timed separately. With linear scaling, the time per field stays roughly
+constant.
+"""
+
+import logging
+import pathlib
+import random
+import tempfile
+import time
+
+from capellambse import decl
+
+from capella_ros_tools import data_model, importer
+
+SIZES = [1_000, 10_000, 50_000]
+FIELDS_PER_MESSAGE = 10
+MESSAGES_PER_PACKAGE = 5
+PRIMITIVES = ["bool", "uint8", "int32", "float64", "string"]
+ROOT = "00000000-0000-0000-0000-000000000000"
+TYPES_PARENT = "00000000-0000-0000-0000-000000000001"
+
+
+def _build_packages(n_fields: int) -> list[data_model.MessagePkgDef]:
+    rng = random.Random(0)
+    n_messages = n_fields // FIELDS_PER_MESSAGE
+    names = [
+        (f"package_{i // MESSAGES_PER_PACKAGE}", f"Message{i}")
+        for i in range(n_messages)
+    ]
+    packages: dict[str, data_model.MessagePkgDef] = {}
+    for pkg_name, msg_name in names:
+        fields = []
+        for k in range(FIELDS_PER_MESSAGE):
+            kind = k % 3
+            if kind == 0:
+                type_def = data_model.TypeDef(
+                    rng.choice(PRIMITIVES), data_model.Range("1", "1")
+                )
+            elif kind == 1:
+                ref_pkg, ref_name = rng.choice(names)
+                type_def = data_model.TypeDef(
+                    ref_name, data_model.Range("1", "1"), ref_pkg
+                )
+            else:
+                type_def = data_model.TypeDef(
+                    f"External{rng.randrange(n_messages)}",
+                    data_model.Range("1", "1"),
+                    "external_msgs",
+                )
+            fields.append(
+                data_model.FieldDef(type_def, f"field_{k}", f"Field {k}.")
+            )
+        pkg_def = packages.setdefault(
+            pkg_name, data_model.MessagePkgDef(pkg_name, [], [])
+        )
+        pkg_def.messages.append(
+            data_model.MessageDef(msg_name, fields, [], f"{msg_name}.")
+        )
+    return list(packages.values())
+
+
+def main() -> None:
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_fields in SIZES:
+            parsed = importer.Importer(
+                pathlib.Path(tmp).as_posix(), no_deps=True
+            )
+            parsed.messages = data_model.MessagePkgDef(
+                "root", [], _build_packages(n_fields)
+            )
+            start = time.perf_counter()
+            with importer._gc_paused():
+                instructions = parsed._build_instructions(ROOT, TYPES_PARENT)
+            converted = time.perf_counter()
+            decl.dump(instructions)
+            dumped = time.perf_counter()
+            convert = converted - start
+            dump = dumped - converted
+            print(
+                f"{n_fields:>7} fields:"
+                f" convert {convert:7.2f} s"
+                f" ({convert / n_fields * 1e6:6.1f} us/field),"
+                f" dump {dump:7.2f} s"
+                f" ({dump / n_fields * 1e6:6.1f} us/field)"
+            )
+
+
+if __name__ == "__main__":
+    main()
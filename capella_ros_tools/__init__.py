@@ -5,6 +5,8 @@
 import logging
 from importlib import metadata
 
+import platformdirs
+
 try:
     __version__ = metadata.version("capella_ros_tools")
 except metadata.PackageNotFoundError:  # pragma: no cover
@@ -12,3 +14,4 @@ except metadata.PackageNotFoundError:  # pragma: no cover
 del metadata
 
 logger = logging.getLogger(__name__)
+dirs = platformdirs.PlatformDirs("capella-ros-tools")
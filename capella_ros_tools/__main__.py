@@ -2,17 +2,27 @@
 # SPDX-License-Identifier: Apache-2.0
 """Main entry point into Capella ROS Tools."""
 
-import io
+import collections.abc as cabc
+import json
 import logging
 import pathlib
+import time
+import typing as t
 import uuid
 
 import capellambse
 import click
-from capellambse import cli_helpers, decl
+from capellambse import cli_helpers
 
 import capella_ros_tools
-from capella_ros_tools import exporter, importer, logger
+from capella_ros_tools import (
+    cache,
+    discovery,
+    exporter,
+    importer,
+    logger,
+    snapshot,
+)
 
 
 @click.group()
@@ -27,101 +37,438 @@ def cli() -> None:
     logging.basicConfig(level=logging.INFO)
 
 
+def _parse_interfaces(
+    ctx: click.Context, param: click.Parameter, value: tuple[str, ...]
+) -> dict[str, str]:
+    del ctx, param
+    interfaces = {}
+    for item in value:
+        name, sep, url = item.partition("=")
+        if not sep or not name or not url:
+            raise click.BadParameter(f"Expected NAME=URL, got {item!r}")
+        interfaces[name] = url
+    return interfaces
+
+
+def _importer_options(
+    func: cabc.Callable[..., None],
+) -> cabc.Callable[..., None]:
+    options = [
+        click.option(
+            "-i",
+            "--input",
+            type=str,
+            required=True,
+            help="Path to the ROS message package.",
+        ),
+        click.option(
+            "-m",
+            "--model",
+            type=cli_helpers.ModelCLI(),
+            required=True,
+            help="Path to the Capella model.",
+        ),
+        click.option(
+            "-l",
+            "--layer",
+            type=click.Choice(["oa", "la", "sa", "pa"], case_sensitive=False),
+            help="The layer to import the messages to.",
+        ),
+        click.option(
+            "-r",
+            "--root",
+            type=click.UUID,
+            help="The UUID of the root package to import the messages to.",
+        ),
+        click.option(
+            "-t",
+            "--types",
+            type=click.UUID,
+            help=(
+                "The UUID of the types package to import the created data"
+                " types to."
+            ),
+        ),
+        click.option(
+            "--no-deps",
+            "no_deps",
+            is_flag=True,
+            help="Don't install message dependencies.",
+        ),
+        click.option(
+            "--license-header",
+            type=click.Path(path_type=pathlib.Path, dir_okay=False),
+            help=(
+                "Ignore the license header from the given file when"
+                " importing msgs."
+            ),
+        ),
+        click.option(
+            "--ignore",
+            metavar="PATTERN",
+            multiple=True,
+            help=(
+                "Glob pattern of directories to skip when searching for"
+                " messages, in addition to "
+                + ", ".join(discovery.DEFAULT_IGNORE)
+                + ". Can be given multiple times."
+            ),
+        ),
+        click.option(
+            "--description-regex",
+            type=str,
+            help="Regular expression to extract description from the file .",
+        ),
+        click.option(
+            "-j",
+            "--jobs",
+            type=click.IntRange(min=1),
+            default=1,
+            show_default=True,
+            help="Number of worker processes to parse the .msg files with.",
+        ),
+        click.option(
+            "--cache",
+            "use_cache",
+            is_flag=True,
+            help="Cache parsed messages in the user cache directory.",
+        ),
+        click.option(
+            "--cache-dir",
+            type=click.Path(path_type=pathlib.Path, file_okay=False),
+            help=(
+                "Cache parsed messages in the given directory."
+                " Implies --cache."
+            ),
+        ),
+        click.option(
+            "--lockfile",
+            type=click.Path(path_type=pathlib.Path, dir_okay=False),
+            help=(
+                "Pin the commits of the dependency repositories in this"
+                " file. Unpinned repositories are recorded at their"
+                " current commit."
+            ),
+        ),
+        click.option(
+            "--offline",
+            is_flag=True,
+            help=(
+                "Load dependencies only from the cache, without contacting"
+                " their repositories. Implies --cache."
+            ),
+        ),
+        click.option(
+            "--snapshot-file",
+            type=click.Path(
+                path_type=pathlib.Path, dir_okay=False, exists=True
+            ),
+            help=(
+                "Load interfaces from a snapshot file, as written by the"
+                " snapshot command, instead of fetching them."
+            ),
+        ),
+        click.option(
+            "--interface",
+            "interfaces",
+            metavar="NAME=URL",
+            multiple=True,
+            callback=_parse_interfaces,
+            help=(
+                "Load dependency packages from an additional repository or"
+                " folder. Can be given multiple times."
+            ),
+        ),
+        click.option(
+            "--lazy-deps",
+            is_flag=True,
+            help=(
+                "Only load the dependency packages that the messages"
+                " reference, directly or indirectly."
+            ),
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def _load_messages(
+    *,
+    input: str,
+    model: capellambse.MelodyModel,
+    layer: str,
+    root: uuid.UUID,
+    types: uuid.UUID,
+    no_deps: bool,
+    license_header: pathlib.Path | None,
+    ignore: tuple[str, ...],
+    description_regex: str | None,
+    jobs: int,
+    use_cache: bool,
+    cache_dir: pathlib.Path | None,
+    lockfile: pathlib.Path | None,
+    offline: bool,
+    snapshot_file: pathlib.Path | None,
+    interfaces: dict[str, str],
+    lazy_deps: bool,
+) -> tuple[importer.Importer, dict[str, t.Any]]:
+    if root:
+        root_uuid = str(root)
+    elif layer:
+        root_uuid = getattr(model, layer).data_package.uuid
+    else:
+        raise click.UsageError("Either --root or --layer must be provided")
+
+    params = {"root_uuid": root_uuid}
+    if types:
+        params["types_uuid"] = str(types)
+    else:
+        params["types_parent_uuid"] = model.sa.data_package.uuid
+
+    parse_cache = dependency_cache = None
+    if use_cache or offline or cache_dir is not None:
+        parse_cache = cache.ParseCache(cache_dir)
+        dependency_cache = cache.DependencyCache(
+            cache_dir / "dependencies" if cache_dir is not None else None
+        )
+
+    parsed = importer.Importer(
+        input,
+        no_deps,
+        license_header,
+        description_regex,
+        jobs,
+        parse_cache,
+        dependency_cache=dependency_cache,
+        lockfile=lockfile,
+        offline=offline,
+        snapshot_path=snapshot_file,
+        interfaces=importer.ROS2_INTERFACES | interfaces,
+        ignore=(*discovery.DEFAULT_IGNORE, *ignore),
+        lazy_deps=lazy_deps,
+    )
+    logger.info("Loaded %d packages", len(parsed.messages.packages))
+    return parsed, params
+
+
 @cli.command("import")
+@_importer_options
 @click.option(
-    "-i",
-    "--input",
-    type=str,
-    required=True,
-    help="Path to the ROS message package.",
-)
-@click.option(
-    "-m",
-    "--model",
-    type=cli_helpers.ModelCLI(),
-    required=True,
-    help="Path to the Capella model.",
-)
-@click.option(
-    "-l",
-    "--layer",
-    type=click.Choice(["oa", "la", "sa", "pa"], case_sensitive=False),
-    help="The layer to import the messages to.",
+    "-o",
+    "--output",
+    type=click.Path(path_type=pathlib.Path, dir_okay=False),
+    help="Produce a declarative YAML instead of modifying the source model.",
 )
 @click.option(
-    "-r",
-    "--root",
-    type=click.UUID,
-    help="The UUID of the root package to import the messages to.",
+    "--shards",
+    type=click.Path(path_type=pathlib.Path, file_okay=False),
+    help=(
+        "Produce one declarative YAML per package in this directory, instead"
+        " of modifying the source model. Uses --jobs worker processes."
+    ),
 )
 @click.option(
-    "-t",
-    "--types",
-    type=click.UUID,
-    help="The UUID of the types package to import the created data types to.",
+    "--checksums",
+    type=click.Path(path_type=pathlib.Path, dir_okay=False),
+    help="Write structural checksums of all messages to a JSON file.",
 )
 @click.option(
-    "--no-deps",
-    "no_deps",
+    "--batches",
     is_flag=True,
-    help="Don't install message dependencies.",
+    help=(
+        "Apply the data types and each package in a separate batch, and"
+        " log the time spent on each batch."
+    ),
 )
 @click.option(
-    "-o",
-    "--output",
+    "--checkpoint",
     type=click.Path(path_type=pathlib.Path, dir_okay=False),
-    help="Produce a declarative YAML instead of modifying the source model.",
+    help=(
+        "Save the model after every batch and record the finished batches"
+        " in this file. Implies --batches."
+    ),
 )
 @click.option(
-    "--license-header",
-    type=click.Path(path_type=pathlib.Path, dir_okay=False),
-    help="Ignore the license header from the given file when importing msgs.",
+    "--resume",
+    is_flag=True,
+    help="Skip the batches recorded in the --checkpoint file.",
 )
 @click.option(
-    "--description-regex",
-    type=str,
-    help="Regular expression to extract description from the file .",
+    "--diff",
+    is_flag=True,
+    help=(
+        "Compare the messages with the current state of the model, and"
+        " only create, update or delete the elements that differ. Can be"
+        " combined with --output."
+    ),
 )
 def import_msgs(
     *,
-    input: str,
     model: capellambse.MelodyModel,
-    layer: str,
-    root: uuid.UUID,
-    types: uuid.UUID,
-    no_deps: bool,
     output: pathlib.Path,
-    license_header: pathlib.Path | None,
-    description_regex: str | None,
+    shards: pathlib.Path | None,
+    checksums: pathlib.Path | None,
+    batches: bool,
+    checkpoint: pathlib.Path | None,
+    resume: bool,
+    diff: bool,
+    **kwargs: t.Any,
 ) -> None:
     """Import ROS messages into a Capella data package."""
-    if root:
-        root_uuid = str(root)
-    elif layer:
-        root_uuid = getattr(model, layer).data_package.uuid
-    else:
-        raise click.UsageError("Either --root or --layer must be provided")
+    if output and shards:
+        raise click.UsageError("--output and --shards are mutually exclusive")
+    if (output or shards) and (batches or checkpoint is not None):
+        raise click.UsageError(
+            "--batches and --checkpoint cannot be combined with --output"
+            " or --shards"
+        )
+    if diff and (shards or batches or checkpoint is not None):
+        raise click.UsageError(
+            "--diff cannot be combined with --shards, --batches"
+            " or --checkpoint"
+        )
+    if resume and checkpoint is None:
+        raise click.UsageError("--resume requires --checkpoint")
+    parsed, params = _load_messages(model=model, **kwargs)
 
-    if types:
-        params = {"types_uuid": str(types)}
-    else:
-        params = {"types_parent_uuid": model.sa.data_package.uuid}
+    if checksums:
+        logger.info("Writing message checksums to file %s", checksums)
+        checksums.write_text(
+            json.dumps(parsed.messages.checksums(), indent=2, sort_keys=True),
+            encoding="utf-8",
+        )
 
-    parsed = importer.Importer(
-        input, no_deps, license_header, description_regex
-    )
-    logger.info("Loaded %d packages", len(parsed.messages.packages))
-
-    yml = parsed.to_yaml(root_uuid, **params)
-    if output:
+    if output and diff:
+        logger.info("Writing declarative YAML diff to file %s", output)
+        output.write_text(
+            parsed.to_yaml(model=model, **params), encoding="utf-8"
+        )
+    elif output:
         logger.info("Writing declarative YAML to file %s", output)
-        output.write_text(yml, encoding="utf-8")
+        with output.open("w", encoding="utf-8") as fp:
+            parsed.to_yaml_stream(fp, **params)
+    elif shards:
+        parsed.to_yaml_shards(shards, jobs=kwargs["jobs"], **params)
+    elif batches or checkpoint is not None:
+        logger.info("Writing to model %s in batches", model.name)
+        parsed.apply_batches(
+            model, checkpoint=checkpoint, resume=resume, **params
+        )
+        if checkpoint is None:
+            model.save()
     else:
         logger.info("Writing to model %s", model.name)
-        decl.apply(model, io.StringIO(yml))
+        parsed.apply(model, diff=diff, **params)
         model.save()
 
 
+@cli.command("watch")
+@_importer_options
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    show_default=True,
+    help="Seconds between two checks for changed .msg files.",
+)
+@click.option(
+    "--save-delay",
+    type=click.FloatRange(min=0),
+    default=5.0,
+    show_default=True,
+    help="Save the model once no change happened for this many seconds.",
+)
+def watch_msgs(
+    *,
+    model: capellambse.MelodyModel,
+    interval: float,
+    save_delay: float,
+    **kwargs: t.Any,
+) -> None:
+    """Keep ROS messages and a Capella data package in sync.
+
+    The messages are imported into the model once, then the input is
+    polled for changed .msg files. Only the packages containing changed
+    files are imported again. The model is saved after --save-delay
+    seconds without further changes, and when the command is stopped
+    with Ctrl+C. Deleted messages and packages are not removed from the
+    model. Packages that cannot be imported are retried on every check.
+    The model may be partially modified then, so it is not saved again
+    until an import succeeds.
+    """
+    parsed, params = _load_messages(model=model, **kwargs)
+    logger.info("Writing to model %s", model.name)
+    parsed.apply(model, **params)
+    last_change: float | None = time.monotonic()
+    failed: list[str] = []
+
+    logger.info(
+        "Watching %s for changes, press Ctrl+C to stop", kwargs["input"]
+    )
+    try:
+        while True:
+            if (
+                last_change is not None
+                and time.monotonic() - last_change >= save_delay
+            ):
+                model.save()
+                logger.info("Saved model %s", model.name)
+                last_change = None
+            time.sleep(interval)
+
+            try:
+                changed = parsed.refresh()
+            except (OSError, ValueError) as err:
+                logger.error("Cannot load messages: %s", err)
+                continue
+            present = {p.name for p in parsed.messages.packages}
+            removed = [p for p in changed if p not in present]
+            if removed:
+                logger.warning(
+                    "Not removing deleted packages from the model: %s",
+                    ", ".join(removed),
+                )
+            packages = [p for p in changed if p in present]
+            packages += [
+                p for p in failed if p in present and p not in packages
+            ]
+            failed = [p for p in failed if p in present]
+            if not packages:
+                continue
+
+            logger.info("Updating packages %s", ", ".join(packages))
+            start = time.perf_counter()
+            try:
+                parsed.apply(model, packages=packages, **params)
+            except Exception:
+                logger.exception(
+                    "Cannot apply changes to the model, retrying on the"
+                    " next check"
+                )
+                failed = packages
+                last_change = None
+                continue
+            failed = []
+            logger.info(
+                "Updated model in %.0f ms",
+                (time.perf_counter() - start) * 1000,
+            )
+            last_change = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if failed:
+            logger.error(
+                "Not saving model %s, cannot import packages %s",
+                model.name,
+                ", ".join(failed),
+            )
+        elif last_change is not None:
+            model.save()
+            logger.info("Saved model %s", model.name)
+
+
 @cli.command("export")
 @click.option(
     "-m",
@@ -149,11 +496,29 @@ def import_msgs(
     default=pathlib.Path.cwd() / "data-package",
     help="Output directory for the .msg files.",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of threads to write the .msg files with.",
+)
+@click.option(
+    "--manifest",
+    type=click.Path(path_type=pathlib.Path, dir_okay=False),
+    help=(
+        "Export manifest to skip unchanged elements with and to remove"
+        " files of deleted elements."
+    ),
+)
 def export_capella(
     model: capellambse.MelodyModel,
     layer: str,
     root: uuid.UUID,
     output: pathlib.Path,
+    jobs: int,
+    manifest: pathlib.Path | None,
 ) -> None:
     """Export Capella data package to ROS messages."""
     if root:
@@ -163,7 +528,59 @@ def export_capella(
     else:
         raise click.UsageError("Either --root or --layer must be provided")
 
-    exporter.export(current_pkg, output)  # type: ignore
+    exporter.export(current_pkg, output, jobs, manifest)  # type: ignore
+
+
+@cli.command("snapshot")
+@click.option(
+    "-c",
+    "--checkout",
+    "checkouts",
+    metavar="NAME=PATH",
+    multiple=True,
+    required=True,
+    callback=_parse_interfaces,
+    help=(
+        "Local checkout of an interface repository. Checkouts of the"
+        " standard ROS2 interfaces are recorded with their URL, so that the"
+        " importer uses them instead of fetching the repository."
+    ),
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(path_type=pathlib.Path, dir_okay=False),
+    required=True,
+    help="Path to write the snapshot to.",
+)
+@click.option(
+    "--license-header",
+    type=click.Path(path_type=pathlib.Path, dir_okay=False),
+    help="Ignore the license header from the given file.",
+)
+def snapshot_interfaces(
+    checkouts: dict[str, str],
+    output: pathlib.Path,
+    license_header: pathlib.Path | None,
+) -> None:
+    """Write a pre-parsed snapshot of interface repositories."""
+    header = license_header.read_text("utf-8") if license_header else None
+    interfaces = {}
+    for name, path in checkouts.items():
+        interfaces[name] = snapshot.parse_checkout(
+            name,
+            pathlib.Path(path),
+            importer.ROS2_INTERFACES.get(name),
+            header,
+        )
+        logger.info(
+            "Parsed %d packages of %s at %s",
+            len(interfaces[name].packages),
+            name,
+            interfaces[name].commit,
+        )
+    snapshot.dump(output, interfaces, header)
+    logger.info("Wrote snapshot to %s", output)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Direct access to the XML tree of a Capella model.
+
+Reading a large data package through the lazy attribute accessors of
+capellambse is slow, so the exporter and the diff import traverse the
+XML elements of the package instead. This relies on private attributes
+of capellambse, which are only accessed in this module. Elements that
+are stored in other fragments of the model are followed into them, as
+the lazy accessors would.
+"""
+
+import collections.abc as cabc
+
+import capellambse
+from capellambse import model as m
+from capellambse.metamodel import information
+from capellambse.metamodel.information import datatype, datavalue
+from lxml import etree
+
+CLASS = m.build_xtype(information.Class)
+PROPERTY = m.build_xtype(information.Property)
+ASSOCIATION = m.build_xtype(information.Association)
+DATA_PKG = m.build_xtype(information.DataPkg)
+ENUMERATION = m.build_xtype(datatype.Enumeration)
+LITERAL = m.build_xtype(datavalue.EnumerationLiteral)
+
+
+def element(obj: m.ModelElement) -> etree._Element:
+    """Return the XML element of a model object."""
+    return obj._element
+
+
+def model_of(obj: m.ModelElement) -> capellambse.MelodyModel:
+    """Return the model that a model object belongs to."""
+    return obj._model
+
+
+def iterchildren(
+    model: capellambse.MelodyModel, elem: etree._Element, *xtypes: str
+) -> cabc.Iterator[etree._Element]:
+    """Iterate over the children of an element, optionally by type.
+
+    Children that are stored in another fragment are yielded in place
+    of the placeholder element that links to them.
+    """
+    return model._loader.iterchildren_xt(elem, *xtypes)
+
+
+def parent(
+    model: capellambse.MelodyModel, elem: etree._Element
+) -> etree._Element | None:
+    """Return the parent of an element, across fragment boundaries."""
+    return next(model._loader.iterancestors(elem), None)
+
+
+def cards(prop_elem: etree._Element) -> tuple[str | None, str | None]:
+    """Return the minimum and maximum cardinality of a property."""
+    values = []
+    for tag in ("ownedMinCard", "ownedMaxCard"):
+        card_elem = prop_elem.find(tag)
+        values.append(
+            None if card_elem is None else card_elem.get("value", "")
+        )
+    return values[0], values[1]
+
+
+class LinkResolver:
+    """Resolve links to other elements, once per distinct link."""
+
+    def __init__(self, model: capellambse.MelodyModel) -> None:
+        self._loader = model._loader
+        self._elements: dict[str, etree._Element | None] = {}
+
+    def __call__(self, link: str | None) -> etree._Element | None:
+        """Return the linked element, or None if it cannot be found."""
+        if not link:
+            return None
+        try:
+            return self._elements[link]
+        except KeyError:
+            pass
+        try:
+            target = self._loader.follow_link(None, link)
+        except (KeyError, ValueError, TypeError):
+            target = None
+        self._elements[link] = target
+        return target
@@ -0,0 +1,192 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Persistent cache for parsed ROS messages."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+
+from capella_ros_tools import data_model, dirs
+
+from . import logger
+
+
+class ParseCache:
+    """Content-addressed on-disk cache for parsed message definitions.
+
+    Entries are keyed by the message name, the file contents, the
+    license header, the description regex and the
+    :data:`~capella_ros_tools.data_model.PARSER_VERSION`. A changed
+    input therefore never produces a stale hit, and entries of unchanged
+    files can be shared between runs and workspaces.
+
+    Parameters
+    ----------
+    path
+        Directory to store the cache entries in. Defaults to a
+        directory in the user's cache directory.
+    """
+
+    def __init__(self, path: pathlib.Path | None = None) -> None:
+        self.path = path or pathlib.Path(dirs.user_cache_dir, "messages")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(
+        msg_name: str,
+        msg_string: str,
+        license_header: str | None = None,
+        msg_description_regex: re.Pattern[str] | None = None,
+    ) -> str:
+        """Compute the cache key for a message file."""
+        if msg_description_regex is not None:
+            regex = [
+                msg_description_regex.pattern,
+                msg_description_regex.flags,
+            ]
+        else:
+            regex = None
+        header = json.dumps(
+            [
+                data_model.PARSER_VERSION,
+                msg_name,
+                license_header or data_model.LICENSE_HEADER,
+                regex,
+            ]
+        )
+        digest = hashlib.sha256(header.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(msg_string.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> data_model.MessageDef | None:
+        """Return the cached message definition, if there is one."""
+        try:
+            data = json.loads(self._entry_path(key).read_text("utf-8"))
+            msg_def = data_model.MessageDef.from_dict(data)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, KeyError, TypeError) as err:
+            logger.debug("Ignoring broken cache entry %s: %s", key, err)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return msg_def
+
+    def put(self, key: str, msg_def: data_model.MessageDef) -> None:
+        """Store a message definition in the cache."""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=path.parent, delete=False
+        ) as tmp:
+            json.dump(msg_def.to_dict(), tmp, separators=(",", ":"))
+        os.replace(tmp.name, path)
+
+
+class DependencyCache:
+    """On-disk cache for the parsed packages of dependency repositories.
+
+    Entries are keyed by the repository URL, the commit, the license
+    header and the :data:`~capella_ros_tools.data_model.PARSER_VERSION`.
+    As a commit never changes, an entry can be used without contacting
+    the repository again.
+
+    Parameters
+    ----------
+    path
+        Directory to store the cache entries in. Defaults to a
+        directory in the user's cache directory.
+    """
+
+    def __init__(self, path: pathlib.Path | None = None) -> None:
+        self.path = path or pathlib.Path(dirs.user_cache_dir, "dependencies")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _options_key(license_header: str | None) -> str:
+        header = json.dumps(
+            [
+                data_model.PARSER_VERSION,
+                license_header or data_model.LICENSE_HEADER,
+            ]
+        )
+        return hashlib.sha256(header.encode("utf-8")).hexdigest()[:16]
+
+    def _repo_path(self, url: str) -> pathlib.Path:
+        return self.path / hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _entry_path(
+        self, url: str, commit: str, license_header: str | None
+    ) -> pathlib.Path:
+        options = self._options_key(license_header)
+        return self._repo_path(url) / f"{commit}-{options}.json"
+
+    def latest_commit(
+        self, url: str, license_header: str | None = None
+    ) -> str | None:
+        """Return the most recently cached commit of a repository."""
+        options = self._options_key(license_header)
+        entries = sorted(
+            self._repo_path(url).glob(f"*-{options}.json"),
+            key=lambda p: p.stat().st_mtime_ns,
+        )
+        if not entries:
+            return None
+        return entries[-1].name.rsplit("-", 1)[0]
+
+    def get(
+        self, url: str, commit: str, license_header: str | None = None
+    ) -> list[data_model.MessagePkgDef] | None:
+        """Return the cached packages of a repository, if there are any."""
+        path = self._entry_path(url, commit, license_header)
+        try:
+            data = json.loads(path.read_text("utf-8"))
+            packages = [
+                data_model.MessagePkgDef.from_dict(pkg)
+                for pkg in data["packages"]
+            ]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, KeyError, TypeError) as err:
+            logger.debug("Ignoring broken cache entry %s: %s", path, err)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return packages
+
+    def put(
+        self,
+        url: str,
+        commit: str,
+        packages: list[data_model.MessagePkgDef],
+        license_header: str | None = None,
+    ) -> None:
+        """Store the parsed packages of a repository in the cache."""
+        path = self._entry_path(url, commit, license_header)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=path.parent, delete=False
+        ) as tmp:
+            json.dump(
+                {
+                    "url": url,
+                    "commit": commit,
+                    "packages": [pkg.to_dict() for pkg in packages],
+                },
+                tmp,
+                separators=(",", ":"),
+            )
+        os.replace(tmp.name, path)
@@ -4,19 +4,36 @@
 
 from __future__ import annotations
 
+import collections
+import collections.abc as cabc
+import concurrent.futures
+import dataclasses
+import enum
+import functools
+import hashlib
 import os
 import pathlib
 import re
+import sys
 import typing as t
 from dataclasses import dataclass
 
 from capellambse.filehandler import abc
 
+if t.TYPE_CHECKING:
+    from capella_ros_tools.cache import ParseCache
+
 LICENSE_HEADER = (
     pathlib.Path(__file__)
     .parent.joinpath(".license_header.txt")
     .read_text(encoding="utf-8")
 )
+PARSER_VERSION = 1
+"""Version of the parser output.
+
+Bump this whenever a change to the parser alters the resulting message
+definitions, so that cached results are invalidated.
+"""
 PACKAGE_NAME_MESSAGE_TYPE_SEPARATOR = "/"
 COMMENT_DELIMITER = "#"
 CONSTANT_SEPARATOR = "="
@@ -34,9 +51,13 @@ VALID_REF_COMMENT_PATTERN = re.compile(
 
 HTML_TAG_PATTERN = re.compile("<.*?>")
 
+_PARSE_WINDOW = 64
+"""Maximum number of message files being parsed in parallel."""
+
 
+@functools.lru_cache(maxsize=4096)
 def _clean_html(raw_html: str) -> str:
-    return re.sub(HTML_TAG_PATTERN, "", raw_html)
+    return HTML_TAG_PATTERN.sub("", raw_html)
 
 
 def _clean_comment(comment: str) -> str:
@@ -50,32 +71,56 @@ class Range(t.NamedTuple):
     max: str
 
 
-@dataclass
+def _card_suffix(card: Range) -> str:
+    if card.min == card.max:
+        return f"[{card.max}]" if card.max != "1" else ""
+    return f"[{UPPER_BOUND_TOKEN}{card.max}]" if card.max != "*" else "[]"
+
+
+@dataclass(frozen=True, slots=True)
 class TypeDef:
-    """Type definition."""
+    """Type definition.
+
+    Type definitions are immutable, which allows identical types to
+    share a single instance, see :meth:`interned`. To change the type of
+    a field, assign a new type definition to it.
+    """
 
     name: str
     card: Range
     package: str | None = None
 
+    def __reduce__(self) -> tuple[t.Any, ...]:
+        """Unpickle type definitions as interned instances."""
+        return (TypeDef.interned, (self.name, self.card, self.package))
+
+    @classmethod
+    def interned(
+        cls, name: str, card: Range, package: str | None = None
+    ) -> TypeDef:
+        """Return the shared instance of the given type definition."""
+        type_def = cls(name, card, package)
+        return _INTERNED_TYPES.setdefault(type_def, type_def)
+
     def __str__(self) -> str:
         """Return string representation of the type."""
-        out = self.name
-        if self.card.min == self.card.max:
-            out += f"[{self.card.max}]" if self.card.max != "1" else ""
-        else:
-            out += (
-                f"[{UPPER_BOUND_TOKEN}{self.card.max}]"
-                if self.card.max != "*"
-                else "[]"
-            )
+        out = self.name + _card_suffix(self.card)
         if self.package:
             out = f"{self.package}{PACKAGE_NAME_MESSAGE_TYPE_SEPARATOR}{out}"
         return out
 
     @classmethod
     def from_string(cls, type_str: str) -> TypeDef:
-        """Create a type definition from a string."""
+        """Create a type definition from a string.
+
+        The returned instance is interned and shared between all callers
+        that pass the same string.
+        """
+        try:
+            return _PARSED_TYPES[type_str]
+        except KeyError:
+            pass
+
         name = type_str
         card = Range("1", "1")
         if type_str.endswith("]"):
@@ -96,10 +141,31 @@ class TypeDef:
             case _:
                 package = None
 
-        return cls(name, card, package)
+        type_def = cls.interned(name, card, package)
+        _PARSED_TYPES[type_str] = type_def
+        return type_def
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Return a JSON compatible representation of the type."""
+        return {
+            "name": self.name,
+            "card": list(self.card),
+            "package": self.package,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> TypeDef:
+        """Create a type definition from its ``to_dict`` representation."""
+        return cls.interned(
+            data["name"], Range(*data["card"]), data["package"]
+        )
 
 
-@dataclass
+_INTERNED_TYPES: dict[TypeDef, TypeDef] = {}
+_PARSED_TYPES: dict[str, TypeDef] = {}
+
+
+@dataclass(slots=True)
 class FieldDef:
     """Definition of a field in a ROS message."""
 
@@ -109,13 +175,31 @@ class FieldDef:
 
     def __str__(self) -> str:
         """Return string representation of the field."""
-        out = f"{self.type} {self.name}"
         if self.description:
-            out += f"    # {_clean_html(self.description)}"
-        return out
+            return (
+                f"{self.type} {self.name}    # {_clean_html(self.description)}"
+            )
+        return f"{self.type} {self.name}"
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Return a JSON compatible representation of the field."""
+        return {
+            "type": self.type.to_dict(),
+            "name": self.name,
+            "description": self.description,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> FieldDef:
+        """Create a field definition from its ``to_dict`` representation."""
+        return cls(
+            TypeDef.from_dict(data["type"]),
+            sys.intern(data["name"]),
+            sys.intern(data["description"]),
+        )
 
 
-@dataclass
+@dataclass(slots=True)
 class ConstantDef:
     """Definition of a constant in a ROS message."""
 
@@ -126,73 +210,231 @@ class ConstantDef:
 
     def __str__(self) -> str:
         """Return string representation of the constant."""
-        out = f"{self.type} {self.name} = {self.value}"
         if self.description:
-            out += f"    # {_clean_html(self.description)}"
-        return out
+            return (
+                f"{self.type} {self.name} = {self.value}"
+                f"    # {_clean_html(self.description)}"
+            )
+        return f"{self.type} {self.name} = {self.value}"
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Return a JSON compatible representation of the constant."""
+        return {
+            "type": self.type.to_dict(),
+            "name": self.name,
+            "value": self.value,
+            "description": self.description,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> ConstantDef:
+        """Create a constant definition from its ``to_dict`` representation."""
+        return cls(
+            TypeDef.from_dict(data["type"]),
+            sys.intern(data["name"]),
+            data["value"],
+            sys.intern(data["description"]),
+        )
+
+
+def _field_key(field: FieldDef) -> tuple[t.Any, ...]:
+    return (field.type, field.name, field.description)
 
 
-@dataclass
+def _constant_key(constant: ConstantDef) -> tuple[t.Any, ...]:
+    return (constant.type, constant.name, constant.value, constant.description)
+
+
+@dataclass(slots=True)
 class EnumDef:
     """Definition of an enum in a ROS message."""
 
     name: str
     literals: list[ConstantDef]
     description: str
-
-    __hash__ = None  # type: ignore[assignment]
+    _key: tuple[t.Any, ...] | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def __str__(self) -> str:
         """Return string representation of the enum."""
-        out = f"# {_clean_html(self.description)}" if self.description else ""
+        return "".join(self.render_lines())
+
+    def render_lines(self) -> t.Iterator[str]:
+        """Render the enum piece by piece.
+
+        Joining the yielded strings results in the same text as
+        :meth:`__str__`, without building it in memory first.
+        """
+        if self.description:
+            yield f"# {_clean_html(self.description)}"
         for literal in self.literals:
-            out += f"\n{literal}"
-        return out
+            yield f"\n{literal}"
+
+    def write_to(self, fp: t.TextIO) -> None:
+        """Write the string representation of the enum to a file."""
+        fp.writelines(self.render_lines())
 
     def __eq__(self, other: object) -> bool:
         """Return whether the enum is equal to another."""
         if not isinstance(other, EnumDef):
             return NotImplemented
-        return (
-            other.name == self.name
-            and all(literal in self.literals for literal in other.literals)
-            and other.description == self.description
+        return self is other or self.structural_key() == other.structural_key()
+
+    def __hash__(self) -> int:
+        """Return the hash of the enum's structural key."""
+        return hash(self.structural_key())
+
+    def structural_key(self) -> tuple[t.Any, ...]:
+        """Return a canonical, hashable key describing the enum.
+
+        The order of the literals is not significant. The key is
+        computed on first use and cached, so the enum must not be
+        modified afterwards.
+        """
+        if self._key is None:
+            self._key = (
+                self.name,
+                frozenset(_constant_key(c) for c in self.literals),
+                self.description,
+            )
+        return self._key
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Return a JSON compatible representation of the enum."""
+        return {
+            "name": self.name,
+            "literals": [literal.to_dict() for literal in self.literals],
+            "description": self.description,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> EnumDef:
+        """Create an enum definition from its ``to_dict`` representation."""
+        return cls(
+            data["name"],
+            [ConstantDef.from_dict(literal) for literal in data["literals"]],
+            sys.intern(data["description"]),
         )
 
 
-def _process_block_comment(line: str) -> str:
-    if comment := _clean_comment(line):
-        return f"{comment} "
-    return ""
+class _TokenKind(enum.Enum):
+    BLANK = enum.auto()
+    """An empty line, separating blocks."""
+    BLOCK_COMMENT = enum.auto()
+    """Consecutive lines of comments starting in the first column."""
+    INDENTED_COMMENT = enum.auto()
+    """Consecutive indented lines consisting only of a comment."""
+    FIELD = enum.auto()
+    """A field definition, optionally followed by a comment."""
+    CONSTANT = enum.auto()
+    """A constant definition, optionally followed by a comment."""
+
+
+class _Token(t.NamedTuple):
+    kind: _TokenKind
+    comment: str | None = None
+    """The cleaned inline comment, or None if the line has none."""
+    comments: t.Sequence[str] = ()
+    """The cleaned lines of a comment token."""
+    type: str = ""
+    name: str = ""
+    value: str = ""
+
+
+_COMMENT_TOKENS = (_TokenKind.BLOCK_COMMENT, _TokenKind.INDENTED_COMMENT)
+
+
+def _tokenize(msg_string: str) -> t.Iterator[_Token]:
+    """Split a message into typed tokens in a single pass.
+
+    Consecutive comment lines of the same kind are merged into one
+    token.
+    """
+    blank = _Token(_TokenKind.BLANK)
+    block_comment = _TokenKind.BLOCK_COMMENT
+    indented_comment = _TokenKind.INDENTED_COMMENT
+    pending_kind: _TokenKind | None = None
+    pending: list[str] = []
+
+    for line in msg_string.lstrip("\n").splitlines():
+        line = line.rstrip()
+        index = line.find(COMMENT_DELIMITER) if line else -1
+        comment = None
+        kind: _TokenKind | None = None
+        if index == 0:
+            kind = block_comment
+            comment = _clean_comment(line)
+        elif index > 0:
+            comment = _clean_comment(line[index:])
+            line = line[:index].rstrip()
+            if not line:
+                kind = indented_comment
+
+        if kind is not pending_kind:
+            if pending_kind is not None:
+                yield _Token(pending_kind, comments=pending)
+            pending_kind = kind
+            pending = []
+        if kind is not None:
+            pending.append(t.cast(str, comment))
+        elif not line:
+            yield blank
+        else:
+            type_string, _, rest = line.partition(" ")
+            name, _, value = rest.partition(CONSTANT_SEPARATOR)
+            name = name.strip()
+            value = value.strip()
+            yield _Token(
+                _TokenKind.CONSTANT if value else _TokenKind.FIELD,
+                comment,
+                (),
+                type_string,
+                name,
+                value,
+            )
+
+    if pending_kind is not None:
+        yield _Token(pending_kind, comments=pending)
+
 
+def _split_file_level_comments(
+    tokens: list[_Token], regex: re.Pattern | None = None
+) -> tuple[str, list[_Token]]:
+    """Split off the comment block at the beginning of the message.
 
-def _extract_file_level_comments(
-    msg_string: str, regex: re.Pattern | None = None
-) -> tuple[str, list[str]]:
-    """Extract comments at the beginning of the message."""
-    lines = msg_string.lstrip("\n").splitlines()
-    lines.append("")
-    file_level_comments = ""
+    The block only counts as file level comment if it is followed by a
+    blank line or the end of the message.
+    """
     i = 0
-    for i, line in enumerate(lines):  # noqa: B007
-        line = line.strip()
-        if not line.startswith(COMMENT_DELIMITER):
-            if line:
-                return "", lines
-            break
-        file_level_comments += _process_block_comment(line) or "\n"
-
+    while i < len(tokens) and tokens[i].kind in _COMMENT_TOKENS:
+        i += 1
+    if i < len(tokens) and tokens[i].kind is not _TokenKind.BLANK:
+        return "", tokens
+
+    parts = [
+        f"{comment} " if comment else "\n"
+        for token in tokens[:i]
+        for comment in token.comments
+    ]
+    file_level_comments = "".join(parts)
     if regex is not None:
         if matches := regex.search(file_level_comments):
             file_level_comments = "\n".join(matches.groups())
         else:
             file_level_comments = ""
     file_level_comments = file_level_comments.replace("\n", "<br>")
-    file_content = lines[i:]
-    return file_level_comments, file_content
+    return file_level_comments, tokens[i:]
+
+
+def _extract_file_level_comments(
+    msg_string: str, regex: re.Pattern | None = None
+) -> tuple[str, list[_Token]]:
+    """Extract comments at the beginning of the message."""
+    return _split_file_level_comments(list(_tokenize(msg_string)), regex)
 
 
-@dataclass
+@dataclass(slots=True)
 class MessageDef:
     """Definition of a ROS message."""
 
@@ -200,30 +442,75 @@ class MessageDef:
     fields: list[FieldDef]
     enums: list[EnumDef]
     description: str
-
-    __hash__ = None  # type: ignore[assignment]
+    _key: tuple[t.Any, ...] | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def __str__(self) -> str:
         """Return string representation of the message."""
+        return "".join(self.render_lines())
+
+    def render_lines(self) -> t.Iterator[str]:
+        """Render the message piece by piece.
+
+        Joining the yielded strings results in the same text as
+        :meth:`__str__`, without building it in memory first.
+        """
         if self.description:
-            out = f"# {_clean_html(self.description)}\n\n"
-        else:
-            out = ""
-        for enum in self.enums:
-            out += f"{enum}\n\n"
+            yield f"# {_clean_html(self.description)}\n\n"
+        for enum_def in self.enums:
+            yield from enum_def.render_lines()
+            yield "\n\n"
         for field in self.fields:
-            out += f"{field}\n"
-        return out
+            yield f"{field}\n"
+
+    def write_to(self, fp: t.TextIO) -> None:
+        """Write the string representation of the message to a file."""
+        fp.writelines(self.render_lines())
 
     def __eq__(self, other: object) -> bool:
         """Return whether the message is equal to another."""
         if not isinstance(other, MessageDef):
             return NotImplemented
-        return (
-            other.name == self.name
-            and all(field in self.fields for field in other.fields)
-            and all(enum in self.enums for enum in other.enums)
-            and other.description == self.description
+        return self is other or self.structural_key() == other.structural_key()
+
+    def __hash__(self) -> int:
+        """Return the hash of the message's structural key."""
+        return hash(self.structural_key())
+
+    def structural_key(self) -> tuple[t.Any, ...]:
+        """Return a canonical, hashable key describing the message.
+
+        The order of fields and enums is not significant. The key is
+        computed on first use and cached, so the message must not be
+        modified afterwards.
+        """
+        if self._key is None:
+            self._key = (
+                self.name,
+                frozenset(_field_key(f) for f in self.fields),
+                frozenset(e.structural_key() for e in self.enums),
+                self.description,
+            )
+        return self._key
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Return a JSON compatible representation of the message."""
+        return {
+            "name": self.name,
+            "fields": [field.to_dict() for field in self.fields],
+            "enums": [enum.to_dict() for enum in self.enums],
+            "description": self.description,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> MessageDef:
+        """Create a message definition from its ``to_dict`` representation."""
+        return cls(
+            data["name"],
+            [FieldDef.from_dict(field) for field in data["fields"]],
+            [EnumDef.from_dict(enum) for enum in data["enums"]],
+            data["description"],
         )
 
     @classmethod
@@ -234,95 +521,92 @@ class MessageDef:
         msg_description_regex: re.Pattern[str] | None = None,
     ) -> MessageDef:
         """Create message definition from a .msg file."""
-        msg_name = file.stem
-        msg_string = file.read_text()
-        license_header = license_header or LICENSE_HEADER
-        msg_string = msg_string.removeprefix(license_header)
-        return cls.from_string(msg_name, msg_string, msg_description_regex)
+        return _parse_message(
+            file.stem, file.read_text(), license_header, msg_description_regex
+        )
+
+    @staticmethod
+    def iter_from_files(
+        files: cabc.Iterable[abc.AbstractFilePath | pathlib.Path],
+        license_header: str | None = None,
+        msg_description_regex: re.Pattern[str] | None = None,
+        executor: concurrent.futures.Executor | None = None,
+        cache: ParseCache | None = None,
+    ) -> t.Iterator[MessageDef]:
+        """Parse the given .msg files one by one, in the given order.
+
+        Parameters
+        ----------
+        files
+            The files to parse.
+        license_header
+            License header to strip from the message files.
+        msg_description_regex
+            Regular expression to extract the message description.
+        executor
+            Executor to parse the message files with, e.g. a
+            :class:`concurrent.futures.ProcessPoolExecutor`. The files
+            are read in the calling process, only parsing is offloaded.
+            At most ``_PARSE_WINDOW`` files are in flight at any time.
+        cache
+            Cache to look up already parsed messages in. Messages that
+            are not found in it are parsed and added to it.
+        """
+        window: collections.deque[
+            tuple[str | None, MessageDef | concurrent.futures.Future]
+        ] = collections.deque()
+        for msg_file in files:
+            msg_name = msg_file.stem
+            msg_string = msg_file.read_text()
+            key = None
+            msg_def = None
+            if cache is not None:
+                key = cache.key(
+                    msg_name, msg_string, license_header, msg_description_regex
+                )
+                msg_def = cache.get(key)
+
+            if msg_def is not None:
+                window.append((None, msg_def))
+            elif executor is not None:
+                future = executor.submit(
+                    _parse_message,
+                    msg_name,
+                    msg_string,
+                    license_header,
+                    msg_description_regex,
+                )
+                window.append((key, future))
+            else:
+                msg_def = _parse_message(
+                    msg_name, msg_string, license_header, msg_description_regex
+                )
+                if cache is not None and key is not None:
+                    cache.put(key, msg_def)
+                window.append((None, msg_def))
+
+            while window and (
+                len(window) >= _PARSE_WINDOW
+                or not isinstance(window[0][1], concurrent.futures.Future)
+            ):
+                yield _resolve_parsed(window.popleft(), cache)
+
+        while window:
+            yield _resolve_parsed(window.popleft(), cache)
 
     @classmethod
-    def from_string(  # noqa: C901 # FIXME too complex
+    def from_string(
         cls,
         msg_name: str,
         msg_string: str,
         msg_description_regex: re.Pattern[str] | None = None,
     ) -> MessageDef:
         """Create message definition from a string."""
-        msg_comments, lines = _extract_file_level_comments(
+        msg_comments, tokens = _extract_file_level_comments(
             msg_string, msg_description_regex
         )
         msg = cls(msg_name, [], [], msg_comments)
-        last_element: t.Any = None
-        block_comments = ""
-        index = -1
-        values: list[str] = []
-
-        for line in lines:
-            line = line.rstrip()
-            if not line:
-                # new block
-                if index != 0:
-                    block_comments = ""
-                continue
-
-            last_index = index
-            index = line.find(COMMENT_DELIMITER)
-            if index == -1:
-                # no comment
-                comment = ""
-            elif index == 0:
-                # block comment
-                if last_index > 0:
-                    # block comments were used
-                    block_comments = ""
-                block_comments += _process_block_comment(line) or "<br>"
-                continue
-            else:
-                # inline comment
-                comment = _clean_comment(line[index:])
-                line = line[:index].rstrip()
-                if not line:
-                    # indented comment
-                    last_element.description += (
-                        f"{comment} " if comment else "<br>"
-                    )
-                    continue
-                comment = f"{comment} "
-
-            type_string, _, rest = line.partition(" ")
-            name, _, value = rest.partition(CONSTANT_SEPARATOR)
-            name = name.strip()
-            value = value.strip()
-            if value:
-                # constant
-                if (
-                    value in values
-                    or not msg.enums
-                    or not isinstance(last_element, ConstantDef)
-                ):
-                    # new enum
-                    enum_def = EnumDef("", [], block_comments)
-                    block_comments = ""
-                    msg.enums.append(enum_def)
-                    values = []
-                constant_def = ConstantDef(
-                    TypeDef.from_string(type_string),
-                    name,
-                    value,
-                    block_comments + comment,
-                )
-                msg.enums[-1].literals.append(constant_def)
-                values.append(value)
-                last_element = constant_def
-            else:
-                # field
-                field_def = FieldDef(
-                    TypeDef.from_string(type_string),
-                    name,
-                    block_comments + comment,
-                )
-                msg.fields.append(field_def)
-                last_element = field_def
+        _build_elements(msg, tokens)
 
         if not msg.fields and len(msg.enums) == 1:
             enum = msg.enums[0]
@@ -346,18 +630,120 @@ class MessageDef:
                 if field.type.name == enum.literals[0].type.name:
                     matched_field = matched_field or field
                     if field.name.lower() == enum.name.lower():
-                        field.type.name = enum.name
-                        field.type.package = msg_name
+                        field.type = TypeDef.interned(
+                            enum.name, field.type.card, msg_name
+                        )
                         break
             else:
                 if matched_field:
                     enum.name = msg_name + matched_field.name.capitalize()
-                    matched_field.type.name = enum.name
-                    matched_field.type.package = msg_name
+                    matched_field.type = TypeDef.interned(
+                        enum.name, matched_field.type.card, msg_name
+                    )
 
         return msg
 
 
+def _build_elements(msg: MessageDef, tokens: list[_Token]) -> None:
+    """Turn the tokens of a message body into fields and enums.
+
+    Description parts are collected in lists and joined once at the
+    end, so that long comment blocks don't cause quadratic copying.
+    """
+    blank = _TokenKind.BLANK
+    block_comment = _TokenKind.BLOCK_COMMENT
+    indented_comment = _TokenKind.INDENTED_COMMENT
+    constant = _TokenKind.CONSTANT
+
+    descriptions: list[tuple[FieldDef | ConstantDef, list[str]]] = []
+    last_parts: list[str] | None = None
+    last_element_kind: _TokenKind | None = None
+    block_parts: list[str] = []
+    block_text = ""
+    values: set[str] = set()
+    # Whether the last non-blank line was a block comment, or whether it
+    # ended with an inline comment.
+    after_block_comment = after_inline_comment = False
+
+    for token in tokens:
+        kind = token.kind
+        if kind is blank:
+            if not after_block_comment:
+                block_parts = []
+                block_text = ""
+            continue
+
+        if kind is block_comment:
+            if after_inline_comment:
+                block_parts = []
+            block_parts.extend(
+                f"{comment} " if comment else "<br>"
+                for comment in token.comments
+            )
+            block_text = ""
+            after_block_comment = True
+            after_inline_comment = False
+            continue
+
+        after_block_comment = False
+        if kind is indented_comment:
+            after_inline_comment = True
+            if last_parts is not None:
+                last_parts.extend(
+                    f"{comment} " if comment else "<br>"
+                    for comment in token.comments
+                )
+            continue
+
+        after_inline_comment = token.comment is not None
+
+        if block_parts and not block_text:
+            block_text = "".join(block_parts)
+        comment = f"{token.comment} " if after_inline_comment else ""
+        type_def = TypeDef.from_string(token.type)
+        element: FieldDef | ConstantDef
+        if kind is constant:
+            if (
+                token.value in values
+                or not msg.enums
+                or last_element_kind is not constant
+            ):
+                msg.enums.append(EnumDef("", [], sys.intern(block_text)))
+                block_parts = []
+                block_text = ""
+                values = set()
+            element = ConstantDef(
+                type_def, sys.intern(token.name), token.value, ""
+            )
+            msg.enums[-1].literals.append(element)
+            values.add(token.value)
+        else:
+            element = FieldDef(type_def, sys.intern(token.name), "")
+            msg.fields.append(element)
+        last_parts = [block_text, comment]
+        last_element_kind = kind
+        descriptions.append((element, last_parts))
+
+    for element, parts in descriptions:
+        element.description = sys.intern("".join(parts))
+
+
+def _parse_message(
+    msg_name: str,
+    msg_string: str,
+    license_header: str | None = None,
+    msg_description_regex: re.Pattern[str] | None = None,
+) -> MessageDef:
+    """Parse the contents of a .msg file.
+
+    This is a module level function so that it can be sent to worker
+    processes.
+    """
+    license_header = license_header or LICENSE_HEADER
+    msg_string = msg_string.removeprefix(license_header)
+    return MessageDef.from_string(msg_name, msg_string, msg_description_regex)
+
+
 def _process_enums(enum: EnumDef) -> str:
     common_prefix = os.path.commonprefix(
         [literal.name for literal in enum.literals]
@@ -378,13 +764,13 @@ def _process_comment(field: FieldDef) -> None:
     """Process comment of a field."""
     if match := VALID_REF_COMMENT_PATTERN.match(field.description):
         ref_msg_name, ref_const_name = match.groups()
-        field.type.package = ref_msg_name
         if ref_const_name:
-            field.type.name = _get_enum_identifier(
+            type_name = _get_enum_identifier(
                 ref_const_name.removesuffix("_XXX")
             )
         else:
-            field.type.name = ref_msg_name
+            type_name = ref_msg_name
+        field.type = TypeDef.interned(type_name, field.type.card, ref_msg_name)
 
 
 def _get_enum_identifier(common_prefix: str) -> str:
@@ -392,24 +778,76 @@ def _get_enum_identifier(common_prefix: str) -> str:
     return "".join([x.capitalize() for x in common_prefix.split("_")])
 
 
-@dataclass
+@dataclass(slots=True)
 class MessagePkgDef:
     """Definition of a ROS message package."""
 
     name: str
     messages: list[MessageDef]
     packages: list[MessagePkgDef]
-
-    __hash__ = None  # type: ignore[assignment]
+    _key: tuple[t.Any, ...] | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def __eq__(self, other: object) -> bool:
         """Return whether the message package is equal to another."""
         if not isinstance(other, MessagePkgDef):
             return NotImplemented
-        return (
-            other.name == self.name
-            and all(message in self.messages for message in other.messages)
-            and all(package in self.packages for package in other.packages)
+        return self is other or self.structural_key() == other.structural_key()
+
+    def __hash__(self) -> int:
+        """Return the hash of the package's structural key."""
+        return hash(self.structural_key())
+
+    def structural_key(self) -> tuple[t.Any, ...]:
+        """Return a canonical, hashable key describing the package.
+
+        The order of messages and subpackages is not significant. The
+        key is computed on first use and cached, so the package must not
+        be modified afterwards.
+        """
+        if self._key is None:
+            self._key = (
+                self.name,
+                frozenset(m.structural_key() for m in self.messages),
+                frozenset(p.structural_key() for p in self.packages),
+            )
+        return self._key
+
+    def checksums(self) -> dict[str, str]:
+        """Compute ROS style structural checksums of all messages.
+
+        Similar to the MD5 sums of ROS, the checksum of a message is
+        computed over a normalized form of its definition, which
+        consists of its constants and fields without comments. Fields
+        that reference another message or enum in this package tree use
+        the checksum of the referenced definition instead of its name.
+        Checksums are computed bottom-up and memoized, so that shared
+        dependencies are only hashed once.
+
+        Returns
+        -------
+        dict[str, str]
+            A mapping from ``package/Message`` to the hex digest of the
+            message's checksum.
+        """
+        return _ChecksumCalculator(self).compute()
+
+    def to_dict(self) -> dict[str, t.Any]:
+        """Return a JSON compatible representation of the package."""
+        return {
+            "name": self.name,
+            "messages": [msg.to_dict() for msg in self.messages],
+            "packages": [pkg.to_dict() for pkg in self.packages],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, t.Any]) -> MessagePkgDef:
+        """Create a package definition from its ``to_dict`` representation."""
+        return cls(
+            data["name"],
+            [MessageDef.from_dict(msg) for msg in data["messages"]],
+            [MessagePkgDef.from_dict(pkg) for pkg in data["packages"]],
         )
 
     @classmethod
@@ -419,16 +857,155 @@ class MessagePkgDef:
         msg_path: abc.AbstractFilePath | pathlib.Path,
         license_header: str | None = None,
         msg_description_regex: re.Pattern[str] | None = None,
+        executor: concurrent.futures.Executor | None = None,
+        cache: ParseCache | None = None,
     ) -> MessagePkgDef:
-        """Create a message package definition from a folder."""
-        out = cls(pkg_name, [], [])
+        """Create a message package definition from a folder.
+
+        See :meth:`iter_messages` for a description of the parameters.
+        """
+        messages = cls.iter_messages(
+            msg_path, license_header, msg_description_regex, executor, cache
+        )
+        return cls(pkg_name, list(messages), [])
+
+    @staticmethod
+    def iter_messages(
+        msg_path: abc.AbstractFilePath | pathlib.Path,
+        license_header: str | None = None,
+        msg_description_regex: re.Pattern[str] | None = None,
+        executor: concurrent.futures.Executor | None = None,
+        cache: ParseCache | None = None,
+    ) -> t.Iterator[MessageDef]:
+        """Parse the messages in a folder one by one.
+
+        The messages are yielded in the sorted order of their file
+        paths, as soon as they are parsed.
+
+        Parameters
+        ----------
+        msg_path
+            Folder to search for ``.msg`` files.
+        license_header
+            License header to strip from the message files.
+        msg_description_regex
+            Regular expression to extract the message description.
+        executor
+            Executor to parse the message files with, see
+            :meth:`MessageDef.iter_from_files`.
+        cache
+            Cache to look up already parsed messages in. Messages that
+            are not found in it are parsed and added to it.
+        """
         files = t.cast(
             t.Iterable[abc.AbstractFilePath | pathlib.Path],
             msg_path.rglob("*.msg"),
         )
-        for msg_file in sorted(files, key=os.fspath):
-            msg_def = MessageDef.from_file(
-                msg_file, license_header, msg_description_regex
-            )
-            out.messages.append(msg_def)
-        return out
+        return MessageDef.iter_from_files(
+            sorted(files, key=os.fspath),
+            license_header,
+            msg_description_regex,
+            executor,
+            cache,
+        )
+
+
+def _resolve_parsed(
+    entry: tuple[str | None, MessageDef | concurrent.futures.Future],
+    cache: ParseCache | None,
+) -> MessageDef:
+    key, result = entry
+    if not isinstance(result, concurrent.futures.Future):
+        return result
+    msg_def = result.result()
+    if cache is not None and key is not None:
+        cache.put(key, msg_def)
+    return msg_def
+
+
+class _ChecksumCalculator:
+    """Compute structural checksums over a message package tree."""
+
+    def __init__(self, root: MessagePkgDef) -> None:
+        self.messages: dict[str, tuple[str, MessageDef]] = {}
+        self.enums: dict[str, EnumDef] = {}
+        self.enum_symbols: dict[str, list[str]] = {}
+        self.memo: dict[str, str] = {}
+        self.in_progress: set[str] = set()
+
+        stack = [root]
+        while stack:
+            pkg_def = stack.pop()
+            stack.extend(reversed(pkg_def.packages))
+            for msg_def in pkg_def.messages:
+                self.messages[f"{pkg_def.name}.{msg_def.name}"] = (
+                    pkg_def.name,
+                    msg_def,
+                )
+                for enum_def in msg_def.enums:
+                    name = f"{msg_def.name}.{enum_def.name}"
+                    symbol = f"{pkg_def.name}.{name}"
+                    self.enums[symbol] = enum_def
+                    self.enum_symbols.setdefault(name, []).append(symbol)
+
+    def compute(self) -> dict[str, str]:
+        checksums = {}
+        for symbol, (pkg_name, msg_def) in self.messages.items():
+            checksum = self._checksum(symbol)
+            if checksum is None:
+                raise RuntimeError(f"Cannot compute checksum of {symbol}")
+            name = f"{pkg_name}{PACKAGE_NAME_MESSAGE_TYPE_SEPARATOR}{msg_def.name}"
+            checksums[name] = checksum
+        return checksums
+
+    def _resolve(self, pkg_name: str, ref: str) -> str:
+        """Return the symbol of a message or enum referenced by a field.
+
+        Enums are referenced by message and enum name. They are looked
+        up in the package of the field first, then in any package, as
+        long as only one defines them.
+        """
+        if ref in self.messages:
+            return ref
+        if f"{pkg_name}.{ref}" in self.enums:
+            return f"{pkg_name}.{ref}"
+        symbols = self.enum_symbols.get(ref, [])
+        return symbols[0] if len(symbols) == 1 else ref
+
+    def _checksum(self, symbol: str) -> str | None:
+        if symbol in self.memo:
+            return self.memo[symbol]
+        if symbol in self.in_progress:
+            return None
+
+        lines: list[str] = []
+        if enum_def := self.enums.get(symbol):
+            lines.extend(_constant_text(c) for c in enum_def.literals)
+        elif symbol in self.messages:
+            self.in_progress.add(symbol)
+            pkg_name, msg_def = self.messages[symbol]
+            for enum_def in msg_def.enums:
+                lines.extend(_constant_text(c) for c in enum_def.literals)
+            for field in msg_def.fields:
+                ref = self._resolve(
+                    pkg_name,
+                    f"{field.type.package or pkg_name}.{field.type.name}",
+                )
+                if (ref_checksum := self._checksum(ref)) is not None:
+                    type_text = ref_checksum + _card_suffix(field.type.card)
+                else:
+                    type_text = str(field.type)
+                lines.append(f"{type_text} {field.name}")
+            self.in_progress.discard(symbol)
+        else:
+            return None
+
+        checksum = hashlib.md5(
+            "\n".join(lines).encode("utf-8"), usedforsecurity=False
+        ).hexdigest()
+        self.memo[symbol] = checksum
+        return checksum
+
+
+def _constant_text(constant: ConstantDef) -> str:
+    return f"{constant.type} {constant.name}={constant.value}"
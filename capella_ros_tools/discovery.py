@@ -0,0 +1,206 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Discovery of ROS message folders in a workspace."""
+
+from __future__ import annotations
+
+import collections.abc as cabc
+import fnmatch
+import os
+import pathlib
+import typing as t
+
+from capellambse.filehandler import abc
+
+DEFAULT_IGNORE = (".git", "build", "install", "log")
+"""Directories that are never searched for message folders."""
+IGNORE_MARKERS = frozenset({"AMENT_IGNORE", "CATKIN_IGNORE", "COLCON_IGNORE"})
+"""Files that exclude the directory containing them from the search."""
+PACKAGE_MANIFEST = "package.xml"
+AMENT_INDEX = "share/ament_index/resource_index/rosidl_interfaces"
+"""Ament resource index of the interface files of each package."""
+
+
+class MessageFolder(t.NamedTuple):
+    """A ``msg`` folder with the message files in it."""
+
+    package: str
+    path: abc.AbstractFilePath | pathlib.Path
+    files: list[abc.AbstractFilePath | pathlib.Path]
+
+
+def _is_ignored(name: str, rel_path: str, ignore: cabc.Sequence[str]) -> bool:
+    return any(
+        fnmatch.fnmatchcase(name, pattern)
+        or fnmatch.fnmatchcase(rel_path, pattern)
+        for pattern in ignore
+    )
+
+
+def _local_files(
+    path: str, rel_path: str, ignore: cabc.Sequence[str]
+) -> list[str]:
+    files = []
+    stack = [(path, rel_path)]
+    while stack:
+        dir_path, dir_rel = stack.pop()
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    child_rel = f"{dir_rel}/{entry.name}"
+                    if not _is_ignored(entry.name, child_rel, ignore):
+                        stack.append((entry.path, child_rel))
+                elif entry.name.endswith(".msg") and entry.is_file():
+                    files.append(entry.path)
+    return sorted(files)
+
+
+def _find_local(
+    name: str, root: pathlib.Path, ignore: cabc.Sequence[str]
+) -> list[MessageFolder]:
+    folders = []
+    stack = [(os.fspath(root), "")]
+    while stack:
+        dir_path, dir_rel = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        names = {entry.name for entry in entries}
+        if dir_rel and not IGNORE_MARKERS.isdisjoint(names):
+            continue
+        is_package = PACKAGE_MANIFEST in names
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            child_rel = f"{dir_rel}/{entry.name}" if dir_rel else entry.name
+            if _is_ignored(entry.name, child_rel, ignore):
+                continue
+            if entry.name == "msg":
+                files = _local_files(entry.path, child_rel, ignore)
+                folders.append(
+                    (
+                        child_rel,
+                        MessageFolder(
+                            os.path.basename(dir_rel) or name,
+                            pathlib.Path(entry.path),
+                            [pathlib.Path(f) for f in files],
+                        ),
+                    )
+                )
+            elif not is_package:
+                stack.append((entry.path, child_rel))
+    folders.sort(key=lambda item: item[0])
+    return [folder for _, folder in folders]
+
+
+def _find_generic(
+    name: str, root: abc.AbstractFilePath, ignore: cabc.Sequence[str]
+) -> list[MessageFolder]:
+    folders = []
+    for msg_dir in sorted(root.rglob("msg"), key=os.fspath):
+        parts = pathlib.PurePosixPath(os.fspath(msg_dir)).parts
+        if any(
+            _is_ignored(part, "/".join(parts[: i + 1]), ignore)
+            for i, part in enumerate(parts)
+        ):
+            continue
+        files = sorted(msg_dir.rglob("*.msg"), key=os.fspath)
+        folders.append(
+            MessageFolder(
+                msg_dir.parent.name or name,
+                msg_dir,
+                t.cast(list[abc.AbstractFilePath | pathlib.Path], files),
+            )
+        )
+    return folders
+
+
+def is_install_prefix(root: pathlib.Path) -> bool:
+    """Return whether ``root`` has an ament index of interface packages."""
+    return root.joinpath(AMENT_INDEX).is_dir()
+
+
+def find_indexed_folders(prefix: pathlib.Path) -> list[MessageFolder]:
+    """Find the ``msg`` folders listed in the ament index of a prefix.
+
+    Every package with interfaces has a resource file in the
+    :data:`AMENT_INDEX` of an install prefix, which lists its interface
+    files relative to ``share/<package>``. Only the index is read, the
+    prefix is not searched, so the lookup time depends on the number of
+    packages rather than the size of the prefix.
+
+    Parameters
+    ----------
+    prefix
+        The install prefix, e.g. ``/opt/ros/humble``.
+
+    Returns
+    -------
+    list[MessageFolder]
+        The folders with their message files, sorted by package name.
+    """
+    folders = []
+    index = prefix / AMENT_INDEX
+    for resource in sorted(os.listdir(index)):
+        with open(index / resource, encoding="utf-8") as fp:
+            interfaces = sorted(
+                line
+                for line in map(str.strip, fp)
+                if line.startswith("msg/") and line.endswith(".msg")
+            )
+        if not interfaces:
+            continue
+        share = prefix / "share" / resource
+        folders.append(
+            MessageFolder(
+                resource,
+                share / "msg",
+                [share / interface for interface in interfaces],
+            )
+        )
+    return folders
+
+
+def find_message_folders(
+    name: str,
+    root: abc.AbstractFilePath | pathlib.Path,
+    ignore: cabc.Sequence[str] = DEFAULT_IGNORE,
+) -> list[MessageFolder]:
+    """Find the ``msg`` folders below a directory.
+
+    Each folder belongs to the package named like the directory that
+    contains it. Local directories are walked only once, with
+    :func:`os.scandir`, collecting the message files along the way.
+    Directories matching an ``ignore`` pattern, and directories
+    containing one of the :data:`IGNORE_MARKERS` are skipped. Inside a
+    package, i.e. a directory with a ``package.xml``, only the ``msg``
+    folder is searched.
+
+    For other sources, only the ``ignore`` patterns are applied.
+
+    If ``root`` is an install prefix with an ament index, the folders
+    are looked up in the index with :func:`find_indexed_folders`
+    instead.
+
+    Parameters
+    ----------
+    name
+        Package name to use for a ``msg`` folder directly in ``root``.
+    root
+        The directory to search.
+    ignore
+        Glob patterns matched against the name and the path relative to
+        ``root`` of each directory.
+
+    Returns
+    -------
+    list[MessageFolder]
+        The folders with their message files, sorted by path.
+    """
+    if isinstance(root, pathlib.Path):
+        if is_install_prefix(root):
+            return find_indexed_folders(root)
+        return _find_local(name, root, ignore)
+    return _find_generic(name, root, ignore)
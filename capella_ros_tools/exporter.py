@@ -2,12 +2,22 @@
 # SPDX-License-Identifier: Apache-2.0
 """Tool for exporting a Capella data package to ROS messages."""
 
+import collections.abc as cabc
+import concurrent.futures
+import contextlib
+import hashlib
+import json
 import pathlib
 import re
+import typing as t
 
+import capellambse
+from capellambse import helpers
 from capellambse.metamodel import information
+from lxml import etree
 
-from capella_ros_tools import data_model
+import capella_ros_tools
+from capella_ros_tools import _xml, data_model
 
 from . import logger
 
@@ -16,69 +26,293 @@ def _clean_name(name: str) -> str:
     return re.sub(r"\W", "", name)
 
 
-def export(
-    current_pkg: information.DataPkg,
-    current_path: pathlib.Path,
-) -> None:
-    """Export a Capella data package to ROS messages."""
-    current_path.mkdir(parents=True, exist_ok=True)
-    for cls_obj in current_pkg.classes:
-        fields = []
-        for prop_obj in cls_obj.owned_properties:
-            try:
-                card = data_model.Range(
-                    prop_obj.min_card.value, prop_obj.max_card.value
+class _Element(t.NamedTuple):
+    uuid: str
+    path: pathlib.Path
+    definition: data_model.MessageDef | data_model.EnumDef
+
+
+def _fingerprint(
+    definition: data_model.MessageDef | data_model.EnumDef,
+) -> str:
+    data = json.dumps(definition.to_dict(), sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _load_manifest(path: pathlib.Path) -> dict[str, dict[str, str | None]]:
+    try:
+        data = json.loads(path.read_text("utf-8"))
+        elements = {
+            uuid: entry
+            for uuid, entry in data["elements"].items()
+            if isinstance(entry, dict) and isinstance(entry.get("path"), str)
+        }
+        if len(elements) < len(data["elements"]):
+            logger.warning(
+                "Ignoring %d broken entries of export manifest %s",
+                len(data["elements"]) - len(elements),
+                path,
+            )
+        if data["version"] != capella_ros_tools.__version__:
+            for entry in elements.values():
+                entry["fingerprint"] = None
+    except FileNotFoundError:
+        return {}
+    except (ValueError, KeyError, TypeError, AttributeError) as err:
+        logger.warning("Ignoring broken export manifest %s: %s", path, err)
+        return {}
+    return elements
+
+
+def _remove_stale(root: pathlib.Path, rel_path: str) -> bool:
+    root = root.resolve()
+    path = (root / rel_path).resolve()
+    if root not in path.parents:
+        logger.warning(
+            "Not removing %s from the export manifest, it is outside of %s",
+            rel_path,
+            root,
+        )
+        return False
+    path.unlink(missing_ok=True)
+    logger.info("Removed stale file %s", path)
+    for parent in path.parents:
+        if parent == root or root not in parent.parents:
+            break
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+    return True
+
+
+def _matches(text: str, pieces: cabc.Iterable[str]) -> bool:
+    pos = 0
+    for piece in pieces:
+        if not text.startswith(piece, pos):
+            return False
+        pos += len(piece)
+    return pos == len(text)
+
+
+def _write_if_changed(
+    path: pathlib.Path,
+    definition: data_model.MessageDef | data_model.EnumDef,
+) -> bool:
+    try:
+        if _matches(path.read_text("utf-8"), definition.render_lines()):
+            return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    with path.open("w", encoding="utf-8") as fp:
+        definition.write_to(fp)
+    return True
+
+
+class _ExportTable:
+    """Flat table of everything the exporter reads from a data package.
+
+    The table is filled in a single traversal of the package's XML
+    tree, instead of going through the lazy attribute accessors of
+    capellambse for every property and literal. Referenced type names
+    are resolved once per distinct type.
+    """
+
+    def __init__(self, model: capellambse.MelodyModel) -> None:
+        self._model = model
+        self._resolve = _xml.LinkResolver(model)
+        self.elements: list[_Element] = []
+
+    def _type_name(self, link: str | None) -> str | None:
+        type_elem = self._resolve(link)
+        return None if type_elem is None else type_elem.get("name", "")
+
+    def add_package(
+        self, pkg_elem: etree._Element, current_path: pathlib.Path
+    ) -> None:
+        current_path.mkdir(parents=True, exist_ok=True)
+        classes = []
+        enums = []
+        packages = []
+        for child in _xml.iterchildren(self._model, pkg_elem):
+            xtype = helpers.xtype_of(child)
+            if xtype == _xml.CLASS:
+                classes.append(child)
+            elif xtype == _xml.ENUMERATION:
+                enums.append(child)
+            elif xtype == _xml.DATA_PKG:
+                packages.append(child)
+
+        for cls_elem in classes:
+            self.elements.append(
+                _Element(
+                    cls_elem.get("id"),
+                    current_path
+                    / f"{_clean_name(cls_elem.get('name', ''))}.msg",
+                    self._message_def(cls_elem),
+                )
+            )
+        for enum_elem in enums:
+            self.elements.append(
+                _Element(
+                    enum_elem.get("id"),
+                    current_path
+                    / f"{_clean_name(enum_elem.get('name', ''))}.msg",
+                    self._enum_def(enum_elem),
                 )
-            except AttributeError:
+            )
+        for sub_elem in packages:
+            name = sub_elem.get("name", "")
+            pkg_path = current_path / _clean_name(name)
+            self.add_package(sub_elem, pkg_path)
+            logger.info("Exported package %s to %s", name, pkg_path)
+
+    def _message_def(self, cls_elem: etree._Element) -> data_model.MessageDef:
+        fields = []
+        for prop_elem in _xml.iterchildren(
+            self._model, cls_elem, _xml.PROPERTY
+        ):
+            min_card, max_card = _xml.cards(prop_elem)
+            if min_card is not None and max_card is not None:
+                card = data_model.Range(min_card, max_card)
+            else:
                 card = data_model.Range("1", "1")
-            type_def = data_model.TypeDef(name=prop_obj.type.name, card=card)
-            prop_def = data_model.FieldDef(
-                type=type_def,
-                name=prop_obj.name,
-                description=prop_obj.description or "",
+            type_name = self._type_name(prop_elem.get("abstractType"))
+            if type_name is None:
+                raise ValueError(
+                    f"Property {prop_elem.get('name', '')!r}"
+                    f" ({prop_elem.get('id')}) has no type"
+                )
+            fields.append(
+                data_model.FieldDef(
+                    type=data_model.TypeDef(name=type_name, card=card),
+                    name=prop_elem.get("name", ""),
+                    description=prop_elem.get("description", ""),
+                )
             )
-            fields.append(prop_def)
-        cls_def = data_model.MessageDef(
-            name=cls_obj.name,
+        return data_model.MessageDef(
+            name=cls_elem.get("name", ""),
             fields=fields,
             enums=[],
-            description=cls_obj.description or "",
-        )
-        (current_path / f"{_clean_name(cls_obj.name)}.msg").write_text(
-            str(cls_def)
+            description=cls_elem.get("description", ""),
         )
 
-    for enum_obj in current_pkg.enumerations:
+    def _enum_def(self, enum_elem: etree._Element) -> data_model.EnumDef:
         literals = []
-        for i, lit_obj in enumerate(enum_obj.owned_literals):
-            try:
-                type_name = lit_obj.value.type.name
-            except AttributeError:
-                type_name = "uint8"
-            try:
-                literal_value = lit_obj.value.value
-            except AttributeError:
-                literal_value = i
-            type_def = data_model.TypeDef(
-                type_name, data_model.Range("1", "1")
-            )
-            lit_def = data_model.ConstantDef(
-                type=type_def,
-                name=lit_obj.name,
-                value=literal_value,
-                description=lit_obj.description or "",
+        lit_elems = _xml.iterchildren(self._model, enum_elem, _xml.LITERAL)
+        for i, lit_elem in enumerate(lit_elems):
+            value_elem = lit_elem.find("domainValue")
+            type_name = None
+            literal_value: t.Any = i
+            if value_elem is not None:
+                type_name = self._type_name(value_elem.get("abstractType"))
+                literal_value = value_elem.get("value", "")
+            literals.append(
+                data_model.ConstantDef(
+                    type=data_model.TypeDef(
+                        type_name or "uint8", data_model.Range("1", "1")
+                    ),
+                    name=lit_elem.get("name", ""),
+                    value=literal_value,
+                    description=lit_elem.get("description", ""),
+                )
             )
-            literals.append(lit_def)
-        enum_def = data_model.EnumDef(
-            name=enum_obj.name,
+        return data_model.EnumDef(
+            name=enum_elem.get("name", ""),
             literals=literals,
-            description=enum_obj.description or "",
+            description=enum_elem.get("description", ""),
         )
-        (current_path / f"{_clean_name(enum_obj.name)}.msg").write_text(
-            str(enum_def)
+
+
+def _collect_package(
+    current_pkg: information.DataPkg,
+    current_path: pathlib.Path,
+) -> list[_Element]:
+    table = _ExportTable(_xml.model_of(current_pkg))
+    table.add_package(_xml.element(current_pkg), current_path)
+    return table.elements
+
+
+def export(
+    current_pkg: information.DataPkg,
+    current_path: pathlib.Path,
+    jobs: int = 1,
+    manifest: pathlib.Path | None = None,
+) -> None:
+    """Export a Capella data package to ROS messages.
+
+    Files whose content would not change are left untouched, so that
+    their modification time stays the same.
+
+    Parameters
+    ----------
+    current_pkg
+        The data package to export.
+    current_path
+        The directory to write the ``.msg`` files to.
+    jobs
+        Number of threads to write the files with. The model is always
+        read from the calling thread.
+    manifest
+        Path to an export manifest. It records the output path and a
+        fingerprint of every exported class and enumeration. Elements
+        whose fingerprint did not change since the last export are
+        neither rendered nor compared with the file on disk. Files that
+        were exported from elements that no longer exist are deleted.
+    """
+    previous = _load_manifest(manifest) if manifest is not None else {}
+    elements: dict[str, dict[str, str | None]] = {}
+    written = skipped = 0
+    with contextlib.ExitStack() as stack:
+        executor = None
+        if jobs > 1:
+            executor = stack.enter_context(
+                concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+            )
+        futures: list[concurrent.futures.Future[bool]] = []
+        for element in _collect_package(current_pkg, current_path):
+            entry: dict[str, str | None] = {
+                "path": element.path.relative_to(current_path).as_posix(),
+                "fingerprint": _fingerprint(element.definition),
+            }
+            elements[element.uuid] = entry
+            if previous.get(element.uuid) == entry and element.path.is_file():
+                skipped += 1
+                continue
+
+            if executor is not None:
+                futures.append(
+                    executor.submit(
+                        _write_if_changed, element.path, element.definition
+                    )
+                )
+            else:
+                written += _write_if_changed(element.path, element.definition)
+        written += sum(future.result() for future in futures)
+
+    removed = 0
+    if manifest is not None:
+        paths = {entry["path"] for entry in elements.values()}
+        stale = {entry["path"] for entry in previous.values()} - paths
+        for rel_path in sorted(p for p in stale if p is not None):
+            removed += _remove_stale(current_path, rel_path)
+        manifest.parent.mkdir(parents=True, exist_ok=True)
+        manifest.write_text(
+            json.dumps(
+                {
+                    "version": capella_ros_tools.__version__,
+                    "elements": elements,
+                },
+                indent=2,
+                sort_keys=True,
+            ),
+            "utf-8",
         )
 
-    for pkg_obj in current_pkg.packages:
-        pkg_path = current_path / _clean_name(pkg_obj.name)
-        export(pkg_obj, pkg_path)
-        logger.info("Exported package %s to %s", pkg_obj.name, pkg_path)
+    logger.info(
+        "Wrote %d of %d files, %d unchanged in the manifest, %d removed",
+        written,
+        len(elements),
+        skipped,
+        removed,
+    )
@@ -2,14 +2,26 @@
 # SPDX-License-Identifier: Apache-2.0
 """Tool for importing ROS messages to a Capella data package."""
 
+import collections.abc as cabc
+import concurrent.futures
+import contextlib
+import gc
+import hashlib
+import io
+import json
 import os
 import pathlib
 import re
+import subprocess
+import threading
+import time
 import typing as t
 
+import capellambse
 from capellambse import decl, filehandler, helpers
 
-from capella_ros_tools import data_model
+from capella_ros_tools import cache as parse_cache
+from capella_ros_tools import data_model, discovery, model_diff, snapshot
 
 from . import logger
 
@@ -18,10 +30,306 @@ ROS2_INTERFACES = {
     "rcl_interfaces": "git+https://github.com/ros2/rcl_interfaces",
     "unique_identifier_msgs": "git+https://github.com/ros2/unique_identifier_msgs",
 }
+LOCKFILE_VERSION = 1
+DATATYPES_SHARD = "_datatypes.yaml"
+
+
+def _compile_description_regex(
+    msg_description_regex: str | None,
+) -> re.Pattern[str] | None:
+    if msg_description_regex is None:
+        return None
+    return re.compile(msg_description_regex, re.MULTILINE)
+
+
+def _find_message_folders(
+    name: str,
+    handler: filehandler.FileHandler,
+    ignore: cabc.Sequence[str] = discovery.DEFAULT_IGNORE,
+) -> list[discovery.MessageFolder]:
+    root: filehandler.abc.FilePath | pathlib.Path = handler.rootdir
+    if isinstance(handler, filehandler.local.LocalFileHandler):
+        root = pathlib.Path(handler.path, handler.subdir)
+    return discovery.find_message_folders(name, root, ignore)
+
+
+@contextlib.contextmanager
+def _gc_paused() -> cabc.Iterator[None]:
+    """Pause the cyclic garbage collector.
+
+    Building the instructions allocates many small, long-lived dicts,
+    which would otherwise trigger repeated full collections.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _file_signature(
+    file: filehandler.abc.FilePath | pathlib.Path,
+) -> tuple[t.Any, ...]:
+    if isinstance(file, pathlib.Path):
+        stat = file.stat()
+        return ("stat", stat.st_mtime_ns, stat.st_size)
+    return ("sha256", hashlib.sha256(file.read_bytes()).hexdigest())
+
+
+def _copy_instructions(obj: t.Any) -> t.Any:
+    """Copy the dicts and lists of decl instructions.
+
+    Applying instructions consumes them, while the converted YAML of the
+    messages is kept for the next import.
+    """
+    if isinstance(obj, dict):
+        return {k: _copy_instructions(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_copy_instructions(v) for v in obj]
+    return obj
+
+
+class _InstructionStream(io.StringIO):
+    """Empty file that stands for already loaded decl instructions."""
+
+    def __init__(self, instructions: list[dict[str, t.Any]]) -> None:
+        super().__init__()
+        self.instructions = instructions
+        self.loaded = False
+
+
+_DECL_LOADER_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def _instruction_loader(stream: _InstructionStream) -> cabc.Iterator[None]:
+    """Let :func:`capellambse.decl.apply` load ``stream`` directly.
+
+    While the context is active, :func:`capellambse.decl.load_with_metadata`
+    returns the instructions of ``stream`` instead of parsing it, and
+    passes any other input on to the original function. The original
+    function is restored when the context is left.
+    """
+    original = getattr(decl, "load_with_metadata", None)
+    if original is None:
+        yield
+        return
+
+    def load(file: t.Any) -> tuple[t.Any, list[dict[str, t.Any]]]:
+        if file is stream:
+            stream.loaded = True
+            return {}, stream.instructions
+        return original(file)
+
+    with _DECL_LOADER_LOCK:
+        decl.load_with_metadata = load
+        try:
+            yield
+        finally:
+            decl.load_with_metadata = original
+
+
+def _apply_instructions(
+    model: capellambse.MelodyModel, instructions: list[dict[str, t.Any]]
+) -> dict[decl.Promise, t.Any]:
+    """Apply decl instructions to a model without a YAML round trip.
+
+    :func:`capellambse.decl.apply` only reads YAML files, so the
+    instructions are passed in through :func:`_instruction_loader`. If
+    ``decl.apply`` did not load them through it, they are serialized to
+    YAML instead.
+    """
+    stream = _InstructionStream(instructions)
+    try:
+        with _instruction_loader(stream):
+            promises = decl.apply(model, stream)
+    except Exception:
+        if stream.loaded:
+            raise
+        logger.debug("Cannot pass instructions to decl, using YAML")
+    else:
+        if stream.loaded:
+            return promises
+    return decl.apply(model, io.StringIO(decl.dump(instructions)))
+
+
+def _resolve_commit(url: str) -> str:
+    """Resolve the commit that ``HEAD`` of a git repository points to."""
+    result = subprocess.run(
+        ["git", "ls-remote", url.removeprefix("git+"), "HEAD"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    listing = result.stdout.split()
+    if not listing:
+        raise ValueError(f"Cannot resolve HEAD of repository {url}")
+    return listing[0]
+
+
+def _load_lockfile(path: pathlib.Path) -> dict[str, dict[str, str]]:
+    try:
+        data = json.loads(path.read_text("utf-8"))
+    except FileNotFoundError:
+        return {}
+    if data.get("version") != LOCKFILE_VERSION:
+        raise ValueError(
+            f"Unsupported lockfile version {data.get('version')!r} in {path}"
+        )
+    return data["interfaces"]
+
+
+def _write_lockfile(
+    path: pathlib.Path, interfaces: dict[str, dict[str, str]]
+) -> None:
+    path.write_text(
+        json.dumps(
+            {"version": LOCKFILE_VERSION, "interfaces": interfaces},
+            indent=2,
+            sort_keys=True,
+        )
+        + "\n",
+        "utf-8",
+    )
+
+
+def _referenced_packages(pkg_def: data_model.MessagePkgDef) -> set[str]:
+    packages = {
+        field_def.type.package
+        for msg_def in pkg_def.messages
+        for field_def in msg_def.fields
+        if field_def.type.package
+    }
+    for sub_pkg in pkg_def.packages:
+        packages |= _referenced_packages(sub_pkg)
+    return packages
+
+
+_DependencySource: t.TypeAlias = tuple[
+    str, discovery.MessageFolder | data_model.MessagePkgDef
+]
+
+
+class _ShardIndex(t.NamedTuple):
+    """What every shard or batch needs to know about all messages."""
+
+    needed_types: dict[str, None]
+    owners: dict[str, tuple[str, str, str]]
+
+
+_shard_worker: "tuple[Importer, _ShardIndex] | None" = None
+
+
+def _init_shard_worker(messages: data_model.MessagePkgDef) -> None:
+    global _shard_worker  # noqa: PLW0603
+    importer = Importer._for_messages(messages)
+    _shard_worker = (importer, importer._shard_index())
+
+
+def _write_shard(
+    path: pathlib.Path, packages: list[str] | None, params: dict[str, str]
+) -> pathlib.Path:
+    if _shard_worker is None:
+        raise RuntimeError("The shard worker was not initialized")
+    importer, index = _shard_worker
+    importer._write_shard(path, packages, index, **params)
+    return path
+
+
+def _load_checkpoint(path: pathlib.Path, fingerprint: str) -> list[str]:
+    try:
+        data = json.loads(path.read_text("utf-8"))
+    except FileNotFoundError:
+        return []
+    if data.get("fingerprint") != fingerprint:
+        logger.warning(
+            "Ignoring checkpoint %s, it was written for different messages",
+            path,
+        )
+        return []
+    return data["done"]
+
+
+def _write_checkpoint(
+    path: pathlib.Path, fingerprint: str, done: list[str]
+) -> None:
+    path.write_text(
+        json.dumps({"fingerprint": fingerprint, "done": done}, indent=2)
+        + "\n",
+        "utf-8",
+    )
+
+
+class BatchTiming(t.NamedTuple):
+    """Time in seconds spent on a batch of :meth:`Importer.apply_batches`."""
+
+    name: str
+    build: float
+    apply: float
+    save: float
+
+
+class _TrackedFile(t.NamedTuple):
+    signature: tuple[t.Any, ...]
+    msg_def: data_model.MessageDef
+
+
+class _ConvertedMessage(t.NamedTuple):
+    msg_def: data_model.MessageDef
+    cls_yml: dict[str, t.Any] | None
+    enum_ymls: list[dict[str, t.Any]]
 
 
 class Importer:
-    """Class for importing ROS messages to a Capella data package."""
+    """Class for importing ROS messages to a Capella data package.
+
+    Parameters
+    ----------
+    msg_path
+        Path or URL of the ROS message packages to import.
+    no_deps
+        Don't load the dependency interface packages.
+    license_header_path
+        File with a license header to strip from the message files.
+    msg_description_regex
+        Regular expression to extract the message descriptions.
+    jobs
+        Number of worker processes to parse the message files with.
+    cache
+        Cache for parsed message files.
+    interfaces
+        The dependency repositories to load, by name. Defaults to
+        :data:`ROS2_INTERFACES`. The repositories are fetched
+        concurrently, their packages keep the order of this mapping.
+    dependency_cache
+        Cache for the parsed packages of dependency repositories at
+        a specific commit.
+    lockfile
+        JSON file pinning the commit of each dependency repository.
+        Repositories that are not pinned yet are resolved to the
+        commit of their ``HEAD``, which is then recorded.
+    offline
+        Don't contact dependency repositories. Their packages are
+        loaded from the dependency cache, at the pinned commit or
+        else the most recently cached one.
+    snapshot_path
+        Pre-parsed snapshot of interface repositories, see
+        :mod:`capella_ros_tools.snapshot`. Repositories in it with the
+        same URL are neither fetched nor parsed, unless the lockfile
+        pins them to a different commit.
+    ignore
+        Glob patterns of directories to skip when searching for message
+        folders, see
+        :func:`~capella_ros_tools.discovery.find_message_folders`.
+    lazy_deps
+        Only load the dependency packages that the messages reference,
+        directly or through other dependency packages. Without a
+        dependency cache, the other packages are not even parsed. With
+        one, repositories that are not cached yet are parsed completely
+        once, so that they can be cached.
+    """
 
     def __init__(
         self,
@@ -29,39 +337,418 @@ class Importer:
         no_deps: bool,  # noqa: FBT001
         license_header_path: pathlib.Path | None = None,
         msg_description_regex: str | None = None,
+        jobs: int = 1,
+        cache: parse_cache.ParseCache | None = None,
+        *,
+        interfaces: cabc.Mapping[str, str] | None = None,
+        dependency_cache: parse_cache.DependencyCache | None = None,
+        lockfile: pathlib.Path | None = None,
+        offline: bool = False,
+        snapshot_path: pathlib.Path | None = None,
+        ignore: cabc.Sequence[str] = discovery.DEFAULT_IGNORE,
+        lazy_deps: bool = False,
     ):
         self.messages = data_model.MessagePkgDef("root", [], [])
+        self._msg_path = msg_path
+        self._msg_description_pattern = _compile_description_regex(
+            msg_description_regex
+        )
+        self._files: dict[str, _TrackedFile] = {}
+        self._local_packages: dict[str, data_model.MessagePkgDef] = {}
+        self._dependency_sources: list[_DependencySource] = []
+        self._loaded_dependencies: dict[int, data_model.MessagePkgDef] = {}
+        self._lazy_deps = lazy_deps
+        self._converted: dict[tuple[str, int], _ConvertedMessage] = {}
         self._promise_ids: dict[str, None] = {}
         self._promise_id_refs: dict[str, None] = {}
         self._needed_associations: dict[str, dict[str, tuple[str, str]]] = {}
         self._license_header = None
         if license_header_path is not None:
             self._license_header = license_header_path.read_text("utf-8")
+        self._cache = cache
+        self._dependency_cache = dependency_cache
+        self._offline = offline
+        self._ignore = ignore
+        self._snapshot: dict[str, snapshot.Interface] = {}
+        if snapshot_path is not None and not no_deps:
+            self._snapshot = snapshot.load(snapshot_path, self._license_header)
 
-        self._add_packages("ros_msgs", msg_path, msg_description_regex)
-        if no_deps:
-            return
+        executor: concurrent.futures.Executor | None = None
+        with contextlib.ExitStack() as stack:
+            if jobs > 1:
+                executor = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+                )
+
+            self._scan(executor)
+            if not no_deps:
+                locked = _load_lockfile(lockfile) if lockfile else {}
+                pinned: dict[str, dict[str, str]] = {}
+                if interfaces is None:
+                    interfaces = ROS2_INTERFACES
+                with concurrent.futures.ThreadPoolExecutor() as fetcher:
+                    futures = [
+                        fetcher.submit(
+                            self._fetch_dependency,
+                            interface_name,
+                            interface_url,
+                            locked.get(interface_name, {}),
+                            executor,
+                            pin=lockfile is not None,
+                        )
+                        for interface_name, interface_url in interfaces.items()
+                    ]
+                for (interface_name, interface_url), future in zip(
+                    interfaces.items(), futures, strict=True
+                ):
+                    commit, sources = future.result()
+                    self._dependency_sources.extend(sources)
+                    if commit is not None:
+                        pinned[interface_name] = {
+                            "url": interface_url,
+                            "commit": commit,
+                        }
+                if lockfile is not None and pinned != locked:
+                    _write_lockfile(lockfile, pinned)
+                    logger.info("Wrote lockfile %s", lockfile)
 
-        for interface_name, interface_url in ROS2_INTERFACES.items():
-            self._add_packages(interface_name, interface_url)
+                if lazy_deps:
+                    self._resolve_dependencies(executor)
+                else:
+                    for i in range(len(self._dependency_sources)):
+                        self._load_dependency(i, executor)
 
-    def _add_packages(
-        self, name: str, path: str, msg_description_regex: str | None = None
-    ) -> None:
-        root = filehandler.get_filehandler(path).rootdir
-        msg_description_pattern = None
-        if msg_description_regex is not None:
-            msg_description_pattern = re.compile(
-                msg_description_regex, re.MULTILINE
+        self._update_messages()
+        if cache is not None:
+            logger.info(
+                "Parse cache: %d hits, %d misses", cache.hits, cache.misses
             )
 
-        for dir in sorted(root.rglob("msg"), key=os.fspath):
-            pkg_name = dir.parent.name or name
-            pkg_def = data_model.MessagePkgDef.from_msg_folder(
-                pkg_name, dir, self._license_header, msg_description_pattern
+    @classmethod
+    def _for_messages(cls, messages: data_model.MessagePkgDef) -> "Importer":
+        """Create an importer that only converts the given messages."""
+        importer = cls.__new__(cls)
+        importer.messages = messages
+        importer._converted = {}
+        importer._promise_ids = {}
+        importer._promise_id_refs = {}
+        importer._needed_associations = {}
+        return importer
+
+    def _fetch_dependency(
+        self,
+        name: str,
+        url: str,
+        locked: cabc.Mapping[str, str],
+        executor: concurrent.futures.Executor | None = None,
+        *,
+        pin: bool = False,
+    ) -> tuple[str | None, list[_DependencySource]]:
+        """Fetch a dependency repository and find its packages.
+
+        This only reads the importer's configuration, so that several
+        repositories can be fetched from different threads. The commit
+        of a git repository is only resolved if it is needed to pin the
+        repository in a lockfile or to look it up in the dependency
+        cache. Otherwise its ``HEAD`` is fetched directly.
+
+        Returns
+        -------
+        str | None
+            The commit the packages were loaded from, or None if the
+            dependency is not a git repository or was not pinned.
+        list[tuple[str, FilePath | MessagePkgDef]]
+            The names of the packages with their message folders, or
+            their parsed definitions if they were already parsed.
+        """
+        interface = self._snapshot.get(name)
+        if (
+            interface is not None
+            and interface.url == url
+            and (
+                locked.get("url") != url
+                or locked.get("commit") == interface.commit
             )
-            self.messages.packages.append(pkg_def)
-            logger.info("Loaded package %s from %s", pkg_name, dir)
+        ):
+            logger.info(
+                "Loaded %d packages of %s from the snapshot",
+                len(interface.packages),
+                name,
+            )
+            return interface.commit, [(p.name, p) for p in interface.packages]
+
+        if not url.startswith("git+"):
+            return None, self._find_packages(name, url, None, self._ignore)
+
+        commit = locked.get("commit") if locked.get("url") == url else None
+        if commit is None and self._offline:
+            if self._dependency_cache is not None:
+                commit = self._dependency_cache.latest_commit(
+                    url, self._license_header
+                )
+        elif commit is None and (pin or self._dependency_cache is not None):
+            commit = _resolve_commit(url)
+
+        if commit is not None and self._dependency_cache is not None:
+            packages = self._dependency_cache.get(
+                url, commit, self._license_header
+            )
+            if packages is not None:
+                logger.info(
+                    "Loaded %d cached packages of %s at %s",
+                    len(packages),
+                    name,
+                    commit,
+                )
+                return commit, [(p.name, p) for p in packages]
+        if self._offline:
+            raise ValueError(
+                f"Dependency {name} ({url}) is not cached, cannot load it"
+                " in offline mode"
+            )
+        if commit is None:
+            return None, self._find_packages(name, url, None, self._ignore)
+
+        sources = self._find_packages(name, url, commit, self._ignore)
+        if self._dependency_cache is None:
+            return commit, sources
+        packages = [
+            self._parse_dependency(pkg_name, source, executor)
+            for pkg_name, source in sources
+        ]
+        self._dependency_cache.put(url, commit, packages, self._license_header)
+        return commit, [(p.name, p) for p in packages]
+
+    @staticmethod
+    def _find_packages(
+        name: str,
+        path: str,
+        revision: str | None = None,
+        ignore: cabc.Sequence[str] = discovery.DEFAULT_IGNORE,
+    ) -> list[_DependencySource]:
+        if revision is None:
+            handler = filehandler.get_filehandler(path)
+        else:
+            handler = filehandler.get_filehandler(path, revision=revision)
+        return [
+            (folder.package, folder)
+            for folder in _find_message_folders(name, handler, ignore)
+        ]
+
+    def _parse_dependency(
+        self,
+        pkg_name: str,
+        source: discovery.MessageFolder | data_model.MessagePkgDef,
+        executor: concurrent.futures.Executor | None = None,
+    ) -> data_model.MessagePkgDef:
+        if isinstance(source, data_model.MessagePkgDef):
+            return source
+        messages = data_model.MessageDef.iter_from_files(
+            source.files, self._license_header, None, executor, self._cache
+        )
+        pkg_def = data_model.MessagePkgDef(pkg_name, list(messages), [])
+        logger.info("Loaded package %s from %s", pkg_name, source.path)
+        return pkg_def
+
+    def _load_dependency(
+        self, index: int, executor: concurrent.futures.Executor | None = None
+    ) -> data_model.MessagePkgDef:
+        pkg_def = self._loaded_dependencies.get(index)
+        if pkg_def is None:
+            pkg_def = self._parse_dependency(
+                *self._dependency_sources[index], executor
+            )
+            self._loaded_dependencies[index] = pkg_def
+        return pkg_def
+
+    def _resolve_dependencies(
+        self, executor: concurrent.futures.Executor | None = None
+    ) -> set[str]:
+        """Load the dependency packages that the messages need.
+
+        Returns
+        -------
+        set[str]
+            The names of the dependency packages that were loaded.
+        """
+        indices: dict[str, list[int]] = {}
+        for i, (pkg_name, _) in enumerate(self._dependency_sources):
+            indices.setdefault(pkg_name, []).append(i)
+        local = {pkg_def.name for pkg_def in self._local_packages.values()}
+        pending = [
+            *self._local_packages.values(),
+            *self._loaded_dependencies.values(),
+        ]
+        seen: set[str] = set()
+        loaded: set[str] = set()
+        while pending:
+            for pkg_name in _referenced_packages(pending.pop()):
+                if pkg_name in seen or pkg_name in local:
+                    continue
+                seen.add(pkg_name)
+                for i in indices.get(pkg_name, ()):
+                    if i not in self._loaded_dependencies:
+                        pending.append(self._load_dependency(i, executor))
+                        loaded.add(pkg_name)
+        return loaded
+
+    def _scan(
+        self, executor: concurrent.futures.Executor | None = None
+    ) -> set[str]:
+        handler = filehandler.get_filehandler(self._msg_path)
+        old_files = self._files
+        old_packages = self._local_packages
+        files: dict[str, _TrackedFile] = {}
+        packages: dict[str, data_model.MessagePkgDef] = {}
+        changed: set[str] = set()
+
+        for pkg_name, dir, msg_files in _find_message_folders(
+            "ros_msgs", handler, self._ignore
+        ):
+            signatures = [_file_signature(f) for f in msg_files]
+            stale = [
+                f
+                for f, signature in zip(msg_files, signatures, strict=True)
+                if getattr(old_files.get(os.fspath(f)), "signature", None)
+                != signature
+            ]
+            parsed = data_model.MessageDef.iter_from_files(
+                stale,
+                self._license_header,
+                self._msg_description_pattern,
+                executor,
+                self._cache,
+            )
+
+            for msg_file, signature in zip(msg_files, signatures, strict=True):
+                tracked = old_files.get(os.fspath(msg_file))
+                if tracked is None or tracked.signature != signature:
+                    tracked = _TrackedFile(signature, next(parsed))
+                files[os.fspath(msg_file)] = tracked
+
+            messages = [files[os.fspath(f)].msg_def for f in msg_files]
+            pkg_def = old_packages.get(os.fspath(dir))
+            if (
+                pkg_def is None
+                or pkg_def.name != pkg_name
+                or len(pkg_def.messages) != len(messages)
+                or any(
+                    a is not b
+                    for a, b in zip(pkg_def.messages, messages, strict=True)
+                )
+            ):
+                pkg_def = data_model.MessagePkgDef(pkg_name, messages, [])
+                changed.add(pkg_name)
+                logger.info("Loaded package %s from %s", pkg_name, dir)
+            packages[os.fspath(dir)] = pkg_def
+
+        for dir_path, pkg_def in old_packages.items():
+            if dir_path not in packages:
+                changed.add(pkg_def.name)
+                logger.info("Removed package %s", pkg_def.name)
+
+        live = {id(tracked.msg_def) for tracked in files.values()}
+        for pkg_def in old_packages.values():
+            for msg_def in pkg_def.messages:
+                if id(msg_def) not in live:
+                    self._converted.pop((pkg_def.name, id(msg_def)), None)
+
+        self._files = files
+        self._local_packages = packages
+        return changed
+
+    def _update_messages(self) -> None:
+        self.messages = data_model.MessagePkgDef(
+            "root",
+            [],
+            [
+                *self._local_packages.values(),
+                *(
+                    self._loaded_dependencies[i]
+                    for i in sorted(self._loaded_dependencies)
+                ),
+            ],
+        )
+
+    def refresh(self) -> list[str]:
+        """Re-import the messages that changed since the last import.
+
+        Only ``.msg`` files that were added or modified since they were
+        last loaded are parsed again, files that were deleted are
+        dropped. Local files are compared by their modification time and
+        size, files from other sources by a hash of their contents.
+        Dependencies are not refreshed, but with ``lazy_deps``,
+        dependency packages that are newly referenced are loaded.
+
+        The converted YAML of unchanged messages is kept, so that a
+        subsequent :meth:`to_yaml` call only has to convert the changed
+        messages again.
+
+        Returns
+        -------
+        list[str]
+            The names of the packages that were added, changed or
+            removed, in sorted order.
+        """
+        changed = self._scan()
+        if self._lazy_deps:
+            changed |= self._resolve_dependencies()
+        if changed:
+            self._update_messages()
+        if self._cache is not None:
+            logger.info(
+                "Parse cache: %d hits, %d misses",
+                self._cache.hits,
+                self._cache.misses,
+            )
+        return sorted(changed)
+
+    @staticmethod
+    def iter_packages(
+        path: str,
+        name: str = "ros_msgs",
+        license_header: str | None = None,
+        msg_description_regex: str | None = None,
+        executor: concurrent.futures.Executor | None = None,
+        cache: parse_cache.ParseCache | None = None,
+        ignore: cabc.Sequence[str] = discovery.DEFAULT_IGNORE,
+    ) -> cabc.Iterator[tuple[str, data_model.MessageDef]]:
+        """Parse the message packages at ``path`` one message at a time.
+
+        This yields ``(package name, message)`` pairs as the files are
+        read, in the same order in which the :class:`Importer` loads
+        them. Consumers can therefore start processing the first
+        messages before the whole tree has been parsed, and don't need
+        to keep all of them in memory.
+
+        Parameters
+        ----------
+        path
+            Path or URL of the folder to search for message packages.
+        name
+            Package name to use for a ``msg`` folder at the top level.
+        license_header
+            License header to strip from the message files.
+        msg_description_regex
+            Regular expression to extract the message description.
+        executor
+            Executor to parse the message files with.
+        cache
+            Cache to look up already parsed messages in.
+        ignore
+            Glob patterns of directories to skip, see
+            :func:`~capella_ros_tools.discovery.find_message_folders`.
+        """
+        msg_description_pattern = _compile_description_regex(
+            msg_description_regex
+        )
+        handler = filehandler.get_filehandler(path)
+        for pkg_name, _, files in _find_message_folders(name, handler, ignore):
+            messages = data_model.MessageDef.iter_from_files(
+                files, license_header, msg_description_pattern, executor, cache
+            )
+            for msg_def in messages:
+                yield pkg_name, msg_def
 
     def _convert_datatype(self, promise_id: str) -> dict[str, t.Any]:
         name = promise_id.split(".", 1)[-1]
@@ -82,24 +769,24 @@ class Importer:
     def _convert_package(
         self,
         pkg_def: data_model.MessagePkgDef,
+        cache: bool = True,  # noqa: FBT001, FBT002
     ) -> dict[str, t.Any]:
         classes = []
         enums = []
         packages = []
 
         for msg_def in pkg_def.messages:
-            if msg_def.fields:
-                cls_yml = self._convert_class(pkg_def.name, msg_def)
-                classes.append(cls_yml)
-            for enum_def in msg_def.enums:
-                enums.append(self._convert_enum(msg_def.name, enum_def))
+            converted = self._convert_message(pkg_def.name, msg_def, cache)
+            if converted.cls_yml is not None:
+                classes.append(converted.cls_yml)
+            enums.extend(converted.enum_ymls)
 
         for new_pkg in pkg_def.packages:
             new_yml = {
                 "find": {
                     "name": new_pkg.name,
                 },
-            } | self._convert_package(new_pkg)
+            } | self._convert_package(new_pkg, cache)
             packages.append(new_yml)
 
         sync = {}
@@ -116,6 +803,71 @@ class Importer:
 
         return yml
 
+    def _convert_message(
+        self,
+        pkg_name: str,
+        msg_def: data_model.MessageDef,
+        cache: bool = True,  # noqa: FBT001, FBT002
+    ) -> _ConvertedMessage:
+        key = (pkg_name, id(msg_def))
+        converted = self._converted.get(key)
+        if converted is not None and converted.msg_def is msg_def:
+            return converted
+
+        cls_yml = None
+        if msg_def.fields:
+            cls_yml = self._convert_class(pkg_name, msg_def)
+        enum_ymls = [
+            self._convert_enum(msg_def.name, enum_def)
+            for enum_def in msg_def.enums
+        ]
+        converted = _ConvertedMessage(msg_def, cls_yml, enum_ymls)
+        if cache:
+            self._converted[key] = converted
+        return converted
+
+    def _register_package(self, pkg_def: data_model.MessagePkgDef) -> None:
+        for msg_def in pkg_def.messages:
+            if msg_def.fields:
+                promise_id = f"{pkg_def.name}.{msg_def.name}"
+                self._promise_ids[promise_id] = None
+                needed_associations = self._needed_associations.setdefault(
+                    pkg_def.name, {}
+                )
+                for field_def in msg_def.fields:
+                    promise_ref = (
+                        f"{field_def.type.package or pkg_def.name}"
+                        f".{field_def.type.name}"
+                    )
+                    self._promise_id_refs[promise_ref] = None
+                    needed_associations[f"{promise_id}.{field_def.name}"] = (
+                        promise_id,
+                        promise_ref,
+                    )
+            for enum_def in msg_def.enums:
+                self._promise_ids[f"{msg_def.name}.{enum_def.name}"] = None
+        for new_pkg in pkg_def.packages:
+            self._register_package(new_pkg)
+
+    def _register_messages(self) -> dict[str, None]:
+        """Collect the promise ids of all messages, in conversion order.
+
+        Returns
+        -------
+        dict[str, None]
+            The promise ids that are referenced, but not defined by any
+            message. They need to be imported as data types.
+        """
+        self._promise_ids.clear()
+        self._promise_id_refs.clear()
+        self._needed_associations.clear()
+        self._register_package(self.messages)
+        return {
+            p: None
+            for p in self._promise_id_refs
+            if p not in self._promise_ids
+        }
+
     def _convert_class(
         self, pkg_name: str, msg_def: data_model.MessageDef
     ) -> dict[str, t.Any]:
@@ -204,109 +956,658 @@ class Importer:
             },
         }
 
+    def _shard_index(self) -> _ShardIndex:
+        """Index all messages once for the shards or batches of a run."""
+        needed_types = self._register_messages()
+        return _ShardIndex(needed_types, self._promise_owners())
+
+    def _promise_owners(self) -> dict[str, tuple[str, str, str]]:
+        owners: dict[str, tuple[str, str, str]] = {}
+        for pkg_def in self.messages.packages:
+            for msg_def in pkg_def.messages:
+                if msg_def.fields:
+                    owners[f"{pkg_def.name}.{msg_def.name}"] = (
+                        pkg_def.name,
+                        "classes",
+                        msg_def.name,
+                    )
+                for enum_def in msg_def.enums:
+                    owners[f"{msg_def.name}.{enum_def.name}"] = (
+                        pkg_def.name,
+                        "enumerations",
+                        enum_def.name,
+                    )
+        return owners
+
+    def _select_packages(
+        self,
+        root_yml: dict[str, t.Any],
+        selected: set[str],
+        owners: dict[str, tuple[str, str, str]],
+    ) -> None:
+        references: dict[str, dict[str, dict[str, t.Any]]] = {}
+        for pkg_name in sorted(selected):
+            needed_associations = self._needed_associations.get(pkg_name, {})
+            for _, promise_ref in needed_associations.values():
+                owner = owners.get(promise_ref)
+                if owner is None or owner[0] in selected:
+                    continue
+                owner_pkg, attr, name = owner
+                references.setdefault(owner_pkg, {}).setdefault(attr, {})[
+                    promise_ref
+                ] = {"promise_id": promise_ref, "find": {"name": name}}
+
+        sync = root_yml.setdefault("sync", {})
+        packages = [
+            pkg_yml
+            for pkg_yml in sync.get("packages", [])
+            if pkg_yml["find"]["name"] in selected
+        ]
+        for pkg_name, attrs in references.items():
+            packages.append(
+                {
+                    "find": {"name": pkg_name},
+                    "sync": {
+                        attr: list(refs.values())
+                        for attr, refs in attrs.items()
+                    },
+                }
+            )
+        sync["packages"] = packages
+
     def to_yaml(
         self,
         root_uuid: str,
         types_parent_uuid: str = "",
         types_uuid: str = "",
+        packages: cabc.Collection[str] | None = None,
+        model: capellambse.MelodyModel | None = None,
     ) -> str:
-        """Import ROS messages into a Capella data package."""
+        """Import ROS messages into a Capella data package.
+
+        Parameters
+        ----------
+        root_uuid
+            UUID of the data package to import the messages to.
+        types_parent_uuid
+            UUID of the data package to create the "Data Types" package
+            for the needed data types in.
+        types_uuid
+            UUID of the data package to import the needed data types to.
+        packages
+            Only import the top-level packages with these names. Classes
+            and enumerations of other packages that they reference are
+            looked up by name, they must already exist in the model.
+        model
+            The model that the YAML will be applied to. If given, only
+            the differences to the packages below ``root_uuid`` in this
+            model are written: new and changed elements, and deletions
+            of elements that no message defines anymore. The model is
+            only read.
+        """
         logger.info("Generating decl YAML")
+        with _gc_paused():
+            instructions = self._build_instructions(
+                root_uuid, types_parent_uuid, types_uuid, packages, model
+            )
+        return decl.dump(instructions)
 
-        instructions = [
-            {"parent": decl.UUIDReference(helpers.UUIDString(root_uuid))}
-            | self._convert_package(self.messages),
-        ]
-        needed_types = [
-            p for p in self._promise_id_refs if p not in self._promise_ids
-        ]
+    def apply(
+        self,
+        model: capellambse.MelodyModel,
+        root_uuid: str,
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+        packages: cabc.Collection[str] | None = None,
+        *,
+        diff: bool = False,
+    ) -> dict[decl.Promise, t.Any]:
+        """Import ROS messages directly into a model.
 
-        for pkg_name, needed_associations in self._needed_associations.items():
-            associations = []
-            for prop_promise_id, (
-                promise_id,
-                promise_ref,
-            ) in needed_associations.items():
-                if promise_ref in needed_types:
-                    instructions.append(
-                        {
-                            "parent": decl.Promise(prop_promise_id),
-                            "set": {
-                                "kind": "UNSET",
-                            },
-                        }
+        This makes the same changes as applying the YAML returned by
+        :meth:`to_yaml`, but passes the instructions to the decl engine
+        without serializing and parsing them again. The model is not
+        saved.
+
+        Parameters
+        ----------
+        model
+            The model to import the messages to.
+        root_uuid
+            UUID of the data package to import the messages to.
+        types_parent_uuid
+            UUID of the data package to create the "Data Types" package
+            for the needed data types in.
+        types_uuid
+            UUID of the data package to import the needed data types to.
+        packages
+            Only import the top-level packages with these names, see
+            :meth:`to_yaml`.
+        diff
+            Compare the packages with their current state in the model
+            first, and only create, update or delete the elements that
+            differ, see :meth:`to_yaml`.
+
+        Returns
+        -------
+        dict[Promise, Any]
+            The model objects created or found for each promise.
+        """
+        logger.info("Generating decl instructions")
+        with _gc_paused():
+            instructions = _copy_instructions(
+                self._build_instructions(
+                    root_uuid,
+                    types_parent_uuid,
+                    types_uuid,
+                    packages,
+                    model if diff else None,
+                )
+            )
+        return _apply_instructions(model, instructions)
+
+    def to_yaml_stream(
+        self,
+        fp: t.TextIO,
+        root_uuid: str,
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+    ) -> None:
+        """Write the import instructions to a file package by package.
+
+        This writes the same changes as :meth:`to_yaml`, but each
+        top-level package is converted, serialized and written on its
+        own, in a separate instruction. Neither all converted packages
+        nor the whole YAML text are held in memory at once.
+
+        Parameters
+        ----------
+        fp
+            The file to write the YAML to.
+        root_uuid
+            UUID of the data package to import the messages to.
+        types_parent_uuid
+            UUID of the data package to create the "Data Types" package
+            for the needed data types in.
+        types_uuid
+            UUID of the data package to import the needed data types to.
+        """
+        logger.info("Writing decl YAML")
+        needed_types = self._register_messages()
+        types_instruction = self._convert_types(
+            needed_types, types_parent_uuid, types_uuid
+        )
+        parent = decl.UUIDReference(helpers.UUIDString(root_uuid))
+
+        root_pkg = data_model.MessagePkgDef(
+            self.messages.name, self.messages.messages, []
+        )
+        with _gc_paused():
+            root_yml = self._convert_package(root_pkg, cache=False)
+        if root_yml:
+            fp.write(decl.dump([{"parent": parent} | root_yml]))
+
+        seen: set[str] = set()
+        for pkg_def in self.messages.packages:
+            with _gc_paused():
+                pkg_yml = {
+                    "find": {"name": pkg_def.name},
+                } | self._convert_package(pkg_def, cache=False)
+            instructions = [
+                {"parent": parent, "sync": {"packages": [pkg_yml]}}
+            ]
+            if pkg_def.name not in seen:
+                seen.add(pkg_def.name)
+                instructions.extend(
+                    self._convert_associations(
+                        pkg_yml, pkg_def.name, needed_types
                     )
-                    continue
-                associations.append(
-                    {
-                        "find": {
-                            "navigable_members": [
-                                decl.Promise(prop_promise_id)
-                            ],
-                        },
-                        "sync": {
-                            "members": [
-                                {
-                                    "find": {
-                                        "type": decl.Promise(promise_id),
-                                    },
-                                    "set": {
-                                        "_type": "Property",
-                                        "kind": "ASSOCIATION",
-                                        "min_card": decl.NewObject(
-                                            "LiteralNumericValue", value="1"
-                                        ),
-                                        "max_card": decl.NewObject(
-                                            "LiteralNumericValue", value="1"
-                                        ),
-                                    },
-                                }
-                            ],
-                        },
-                    }
                 )
+            fp.write(decl.dump(instructions))
+            del instructions, pkg_yml
+
+        if types_instruction is not None:
+            fp.write(decl.dump([types_instruction]))
+
+    def to_yaml_shards(
+        self,
+        output: pathlib.Path,
+        root_uuid: str,
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+        packages: cabc.Collection[str] | None = None,
+        jobs: int = 1,
+    ) -> list[pathlib.Path]:
+        """Write the import instructions to one file per package.
+
+        Every top-level package is written to ``<name>.yaml`` in the
+        ``output`` directory, the data types for all packages to
+        :data:`DATATYPES_SHARD`. Each file can be applied on its own:
+        it finds or creates the data types it needs, and it finds or
+        creates the classes and enumerations of other packages that it
+        references by name. Applying the data types first and then the
+        packages, in any order, yields the same model as applying the
+        output of :meth:`to_yaml`.
 
-            if associations:
-                package = next(
-                    p
-                    for p in instructions[0]["sync"]["packages"]
-                    if p["find"]["name"] == pkg_name
+        Parameters
+        ----------
+        output
+            The directory to write the files to.
+        root_uuid
+            UUID of the data package to import the messages to.
+        types_parent_uuid
+            UUID of the data package to create the "Data Types" package
+            for the needed data types in.
+        types_uuid
+            UUID of the data package to import the needed data types to.
+        packages
+            Only write the files of the top-level packages with these
+            names, and the data types.
+        jobs
+            Number of worker processes to convert and write the files
+            with.
+
+        Returns
+        -------
+        list[pathlib.Path]
+            The written files, in the order to apply them in.
+        """
+        params = {
+            "root_uuid": root_uuid,
+            "types_parent_uuid": types_parent_uuid,
+            "types_uuid": types_uuid,
+        }
+        names = list(dict.fromkeys(p.name for p in self.messages.packages))
+        if packages is not None:
+            names = [name for name in names if name in packages]
+        shards: list[tuple[pathlib.Path, list[str] | None]] = [
+            (output / DATATYPES_SHARD, None),
+            *((output / f"{name}.yaml", [name]) for name in names),
+        ]
+        output.mkdir(parents=True, exist_ok=True)
+        logger.info("Writing %d decl YAML shards to %s", len(shards), output)
+        if jobs <= 1:
+            index = self._shard_index()
+            for path, selected in shards:
+                self._write_shard(path, selected, index, **params)
+            return [path for path, _ in shards]
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_shard_worker,
+            initargs=(self.messages,),
+        ) as executor:
+            futures = [
+                executor.submit(_write_shard, path, selected, params)
+                for path, selected in shards
+            ]
+            return [future.result() for future in futures]
+
+    def _write_shard(
+        self,
+        path: pathlib.Path,
+        packages: list[str] | None,
+        index: _ShardIndex,
+        root_uuid: str,
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+    ) -> None:
+        instructions = self._shard_instructions(
+            packages, index, root_uuid, types_parent_uuid, types_uuid
+        )
+        with path.open("w", encoding="utf-8") as fp:
+            fp.write(decl.dump(instructions))
+
+    def _shard_instructions(
+        self,
+        packages: list[str] | None,
+        index: _ShardIndex,
+        root_uuid: str,
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+    ) -> list[dict[str, t.Any]]:
+        """Build the instructions of a package, or of the data types.
+
+        Only the selected package is converted. Which data types and
+        which other packages it needs is looked up in ``index``, which
+        is built once for all shards.
+        """
+        with _gc_paused():
+            if packages is not None:
+                return self._build_instructions(
+                    root_uuid,
+                    types_parent_uuid,
+                    types_uuid,
+                    packages,
+                    index=index,
                 )
-                package["sync"]["owned_associations"] = associations
+            types_instruction = self._convert_types(
+                index.needed_types, types_parent_uuid, types_uuid
+            )
+        return [types_instruction] if types_instruction else []
+
+    def apply_batches(
+        self,
+        model: capellambse.MelodyModel,
+        root_uuid: str,
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+        checkpoint: pathlib.Path | None = None,
+        resume: bool = False,  # noqa: FBT001, FBT002
+    ) -> list[BatchTiming]:
+        """Import ROS messages into a model one package at a time.
 
-        if not needed_types:
-            return decl.dump(instructions)
+        The data types are applied first, then each top-level package
+        on its own, in the same batches as :meth:`to_yaml_shards`.
 
-        datatypes = [
-            self._convert_datatype(promise_id) for promise_id in needed_types
+        Parameters
+        ----------
+        model
+            The model to import the messages to.
+        root_uuid
+            UUID of the data package to import the messages to.
+        types_parent_uuid
+            UUID of the data package to create the "Data Types" package
+            for the needed data types in.
+        types_uuid
+            UUID of the data package to import the needed data types to.
+        checkpoint
+            JSON file to record the finished batches in. The model is
+            saved after every batch, before the batch is recorded.
+        resume
+            Skip the batches recorded in ``checkpoint``, if it was
+            written for the same messages and target packages.
+
+        Returns
+        -------
+        list[BatchTiming]
+            The time spent on each applied batch.
+        """
+        params = {
+            "root_uuid": root_uuid,
+            "types_parent_uuid": types_parent_uuid,
+            "types_uuid": types_uuid,
+        }
+        data = json.dumps(
+            [self.messages.to_dict(), params], sort_keys=True
+        ).encode("utf-8")
+        fingerprint = hashlib.sha256(data).hexdigest()
+        done: list[str] = []
+        if resume and checkpoint is not None:
+            done = _load_checkpoint(checkpoint, fingerprint)
+            logger.info("Resuming after %d finished batches", len(done))
+
+        batches: list[tuple[str, list[str] | None]] = [
+            (DATATYPES_SHARD.removesuffix(".yaml"), None),
+            *(
+                (name, [name])
+                for name in dict.fromkeys(
+                    p.name for p in self.messages.packages
+                )
+            ),
         ]
-        if types_uuid:
-            instructions.append(
-                {
-                    "parent": decl.UUIDReference(
-                        helpers.UUIDString(types_uuid)
-                    ),
-                    "sync": {"datatypes": datatypes},
-                }
+        index = self._shard_index()
+        timings = []
+        for i, (name, packages) in enumerate(batches, 1):
+            if name in done:
+                continue
+            start = time.perf_counter()
+            instructions = _copy_instructions(
+                self._shard_instructions(packages, index, **params)
+            )
+            built = time.perf_counter()
+            _apply_instructions(model, instructions)
+            applied = time.perf_counter()
+            if checkpoint is not None:
+                model.save()
+                done.append(name)
+                _write_checkpoint(checkpoint, fingerprint, done)
+            timing = BatchTiming(
+                name,
+                built - start,
+                applied - built,
+                time.perf_counter() - applied,
+            )
+            timings.append(timing)
+            logger.info(
+                "Applied batch %s (%d/%d) in %.2f s:"
+                " build %.2f s, apply %.2f s, save %.2f s",
+                name,
+                i,
+                len(batches),
+                sum(timing[1:]),
+                timing.build,
+                timing.apply,
+                timing.save,
+            )
+        return timings
+
+    def _build_instructions(
+        self,
+        root_uuid: str,
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+        packages: cabc.Collection[str] | None = None,
+        model: capellambse.MelodyModel | None = None,
+        *,
+        index: _ShardIndex | None = None,
+    ) -> list[dict[str, t.Any]]:
+        if index is not None:
+            needed_types = index.needed_types
+        else:
+            needed_types = self._register_messages()
+        if packages is None:
+            selected = None
+            root_yml = self._convert_package(self.messages)
+        else:
+            selected = set(packages)
+            root_yml = self._convert_package(
+                data_model.MessagePkgDef(
+                    self.messages.name,
+                    self.messages.messages,
+                    [p for p in self.messages.packages if p.name in selected],
+                )
             )
-        elif types_parent_uuid:
+            owners = self._promise_owners() if index is None else index.owners
+            self._select_packages(root_yml, selected, owners)
+            used_refs = {
+                promise_ref
+                for pkg_name in selected
+                for _, promise_ref in self._needed_associations.get(
+                    pkg_name, {}
+                ).values()
+            }
+            needed_types = {p: None for p in needed_types if p in used_refs}
+        package_index: dict[str, dict[str, t.Any]] = {}
+        for pkg_yml in root_yml.get("sync", {}).get("packages", []):
+            package_index.setdefault(pkg_yml["find"]["name"], pkg_yml)
+
+        unset = []
+        for pkg_name in self._needed_associations:
+            if selected is not None and pkg_name not in selected:
+                continue
+            unset.extend(
+                self._convert_associations(
+                    package_index[pkg_name], pkg_name, needed_types
+                )
+            )
+
+        instructions: list[dict[str, t.Any]] = []
+        if model is not None:
+            instructions, kept, refs = self._diff_packages(
+                model, root_uuid, root_yml, needed_types, selected
+            )
+            unset = [i for i in unset if i["parent"].identifier in kept]
+            needed_types = {p: None for p in needed_types if p in refs}
+        if model is None or any(root_yml.get("sync", {}).values()):
             instructions.append(
+                {"parent": decl.UUIDReference(helpers.UUIDString(root_uuid))}
+                | root_yml
+            )
+        instructions.extend(unset)
+
+        types_instruction = self._convert_types(
+            needed_types, types_parent_uuid, types_uuid
+        )
+        if types_instruction is not None:
+            instructions.append(types_instruction)
+        return instructions
+
+    def _diff_packages(
+        self,
+        model: capellambse.MelodyModel,
+        root_uuid: str,
+        root_yml: dict[str, t.Any],
+        needed_types: cabc.Container[str],
+        selected: cabc.Container[str] | None,
+    ) -> tuple[list[dict[str, t.Any]], set[str], set[str]]:
+        """Drop the instructions for elements that match the model.
+
+        Classes and enumerations are compared with the model by name,
+        their properties and literals by name within them. Packages are
+        never deleted.
+
+        Returns
+        -------
+        tuple[list[dict[str, Any]], set[str], set[str]]
+            The instructions to delete elements, the promise ids of the
+            kept properties, and the promise ids of their types.
+        """
+        pkg_defs = [
+            pkg_def
+            for pkg_def in self.messages.packages
+            if selected is None or pkg_def.name in selected
+        ]
+        expected: dict[str, tuple[set[str], set[str]]] = {}
+        for pkg_def in pkg_defs:
+            classes, enums = expected.setdefault(pkg_def.name, (set(), set()))
+            for msg_def in pkg_def.messages:
+                if msg_def.fields:
+                    classes.add(msg_def.name)
+                enums.update(enum_def.name for enum_def in msg_def.enums)
+        owners = self._promise_owners()
+
+        def expected_type(promise_ref: str) -> tuple[t.Any, str]:
+            if promise_ref in needed_types:
+                find = self._convert_datatype(promise_ref)["find"]
+                return (find["_type"], find["name"], None), "UNSET"
+            pkg_name, attr, name = owners.get(promise_ref, ("", "", ""))
+            kind = "Class" if attr == "classes" else "Enumeration"
+            return (kind, name, pkg_name), "COMPOSITION"
+
+        diff = model_diff.ModelDiff(
+            model_diff.ModelTable(model, root_uuid, expected), expected_type
+        )
+        sync = root_yml.get("sync", {})
+        packages = sync.get("packages", [])
+        for pkg_def, pkg_yml in zip(pkg_defs, packages, strict=False):
+            diff.add_package(pkg_def, pkg_yml)
+        if sync:
+            sync["packages"] = (
+                diff.finish(expected) + packages[len(pkg_defs) :]
+            )
+        else:
+            diff.finish(expected)
+        logger.info(
+            "%d classes and enumerations differ from the model,"
+            " %d delete instructions",
+            diff.changed,
+            len(diff.deletions),
+        )
+        return diff.deletions, set(diff.kept_props), diff.refs
+
+    def _convert_associations(
+        self,
+        pkg_yml: dict[str, t.Any],
+        pkg_name: str,
+        needed_types: cabc.Container[str],
+    ) -> list[dict[str, t.Any]]:
+        """Add the associations of a package to its YAML.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            Instructions to unset the kind of properties that refer to
+            data types instead of classes.
+        """
+        instructions = []
+        associations = []
+        needed_associations = self._needed_associations.get(pkg_name, {})
+        for prop_promise_id, (
+            promise_id,
+            promise_ref,
+        ) in needed_associations.items():
+            if promise_ref in needed_types:
+                instructions.append(
+                    {
+                        "parent": decl.Promise(prop_promise_id),
+                        "set": {
+                            "kind": "UNSET",
+                        },
+                    }
+                )
+                continue
+            associations.append(
                 {
-                    "parent": decl.UUIDReference(
-                        helpers.UUIDString(types_parent_uuid)
-                    ),
+                    "find": {
+                        "navigable_members": [decl.Promise(prop_promise_id)],
+                    },
                     "sync": {
-                        "packages": [
+                        "members": [
                             {
-                                "find": {"name": "Data Types"},
-                                "sync": {"datatypes": datatypes},
+                                "find": {
+                                    "type": decl.Promise(promise_id),
+                                },
+                                "set": {
+                                    "_type": "Property",
+                                    "kind": "ASSOCIATION",
+                                    "min_card": decl.NewObject(
+                                        "LiteralNumericValue", value="1"
+                                    ),
+                                    "max_card": decl.NewObject(
+                                        "LiteralNumericValue", value="1"
+                                    ),
+                                },
                             }
                         ],
                     },
                 }
             )
-        else:
-            raise ValueError(
-                "Either types_parent_uuid or types_uuid must be provided"
-            )
-        return decl.dump(instructions)
+
+        if associations:
+            pkg_yml["sync"]["owned_associations"] = associations
+        return instructions
+
+    def _convert_types(
+        self,
+        needed_types: cabc.Iterable[str],
+        types_parent_uuid: str = "",
+        types_uuid: str = "",
+    ) -> dict[str, t.Any] | None:
+        datatypes = [
+            self._convert_datatype(promise_id) for promise_id in needed_types
+        ]
+        if not datatypes:
+            return None
+        if types_uuid:
+            return {
+                "parent": decl.UUIDReference(helpers.UUIDString(types_uuid)),
+                "sync": {"datatypes": datatypes},
+            }
+        if types_parent_uuid:
+            return {
+                "parent": decl.UUIDReference(
+                    helpers.UUIDString(types_parent_uuid)
+                ),
+                "sync": {
+                    "packages": [
+                        {
+                            "find": {"name": "Data Types"},
+                            "sync": {"datatypes": datatypes},
+                        }
+                    ],
+                },
+            }
+        raise ValueError(
+            "Either types_parent_uuid or types_uuid must be provided"
+        )
@@ -0,0 +1,408 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Comparison of imported messages with the current state of a model."""
+
+import collections.abc as cabc
+import typing as t
+
+import capellambse
+from capellambse import decl, helpers
+from lxml import etree
+
+from capella_ros_tools import _xml, data_model
+
+
+class _ModelMember(t.NamedTuple):
+    uuid: str
+    description: str
+    state: tuple[t.Any, ...]
+
+
+class _ModelElement(t.NamedTuple):
+    uuid: str
+    description: str
+    members: dict[str, _ModelMember]
+
+
+class _ModelPackage(t.NamedTuple):
+    uuid: str
+    classes: dict[str, _ModelElement]
+    enumerations: dict[str, _ModelElement]
+    associations: dict[str, str]
+
+
+class ModelTable:
+    """The current state of the packages that a diff import compares.
+
+    Like the exporter, the table is filled in a single traversal of the
+    XML tree of each package. Referenced types are resolved once per
+    distinct type, to their kind, name and, for classes and
+    enumerations, the name of the package that owns them.
+    """
+
+    def __init__(
+        self,
+        model: capellambse.MelodyModel,
+        root_uuid: str,
+        names: cabc.Container[str],
+    ) -> None:
+        self._model = model
+        self._resolve = _xml.LinkResolver(model)
+        self._types: dict[str, tuple[str, str, str | None] | None] = {}
+        self.packages: dict[str, _ModelPackage] = {}
+        root = _xml.element(model.by_uuid(root_uuid))
+        for pkg_elem in _xml.iterchildren(model, root, _xml.DATA_PKG):
+            name = pkg_elem.get("name", "")
+            if name in names and name not in self.packages:
+                self.packages[name] = self._package(pkg_elem)
+
+    def _type(self, link: str | None) -> tuple[str, str, str | None] | None:
+        if not link:
+            return None
+        try:
+            return self._types[link]
+        except KeyError:
+            pass
+        type_elem = self._resolve(link)
+        type_key = None
+        if type_elem is not None:
+            kind = (helpers.xtype_of(type_elem) or "").rsplit(":", 1)[-1]
+            owner = None
+            if kind in {"Class", "Enumeration"}:
+                owner_elem = _xml.parent(self._model, type_elem)
+                if owner_elem is not None:
+                    owner = owner_elem.get("name", "")
+            type_key = (kind, type_elem.get("name", ""), owner)
+        self._types[link] = type_key
+        return type_key
+
+    def _package(self, pkg_elem: etree._Element) -> _ModelPackage:
+        classes: dict[str, _ModelElement] = {}
+        enums: dict[str, _ModelElement] = {}
+        associations: dict[str, str] = {}
+        for child in _xml.iterchildren(self._model, pkg_elem):
+            xtype = helpers.xtype_of(child)
+            name = child.get("name", "")
+            if xtype == _xml.CLASS and name not in classes:
+                classes[name] = self._element(
+                    child, _xml.PROPERTY, self._property
+                )
+            elif xtype == _xml.ENUMERATION and name not in enums:
+                enums[name] = self._element(child, _xml.LITERAL, self._literal)
+            elif xtype == _xml.ASSOCIATION:
+                for link in child.get("navigableMembers", "").split():
+                    associations[link.rsplit("#", 1)[-1]] = child.get("id")
+        return _ModelPackage(pkg_elem.get("id"), classes, enums, associations)
+
+    def _element(
+        self,
+        elem: etree._Element,
+        member_xtype: str,
+        read: cabc.Callable[[etree._Element], tuple[t.Any, ...]],
+    ) -> _ModelElement:
+        members: dict[str, _ModelMember] = {}
+        for child in _xml.iterchildren(self._model, elem, member_xtype):
+            name = child.get("name", "")
+            if name not in members:
+                members[name] = _ModelMember(
+                    child.get("id"), child.get("description", ""), read(child)
+                )
+        return _ModelElement(
+            elem.get("id"), elem.get("description", ""), members
+        )
+
+    def _property(self, prop_elem: etree._Element) -> tuple[t.Any, ...]:
+        return (
+            self._type(prop_elem.get("abstractType")),
+            prop_elem.get("aggregationKind", "UNSET"),
+            *_xml.cards(prop_elem),
+        )
+
+    def _literal(self, lit_elem: etree._Element) -> tuple[t.Any, ...]:
+        value_elem = lit_elem.find("domainValue")
+        return (None if value_elem is None else value_elem.get("value"),)
+
+
+def _changed(current: _ModelElement | _ModelMember, description: str) -> bool:
+    return bool(description) and description != current.description
+
+
+def _delete(
+    uuid: str, deletions: cabc.Mapping[str, cabc.Iterable[str]]
+) -> dict[str, t.Any]:
+    return {
+        "parent": decl.UUIDReference(helpers.UUIDString(uuid)),
+        "delete": {
+            attr: [decl.UUIDReference(helpers.UUIDString(u)) for u in uuids]
+            for attr, uuids in deletions.items()
+        },
+    }
+
+
+_PackageDiff = tuple[
+    dict[str, t.Any],
+    list[dict[str, t.Any]] | None,
+    list[dict[str, t.Any]],
+]
+
+
+class ModelDiff:
+    """Reduce the instructions of packages to their differences.
+
+    Only new or changed properties and literals are kept, along with
+    the classes and enumerations that own them. Unchanged classes and
+    enumerations that a kept property refers to are only looked up by
+    name. Elements that no message defines anymore are deleted,
+    together with the associations of deleted properties.
+    """
+
+    def __init__(
+        self,
+        table: ModelTable,
+        expected_type: cabc.Callable[[str], tuple[t.Any, str]],
+    ) -> None:
+        self._table = table
+        self._expected_type = expected_type
+        self._packages: list[_PackageDiff] = []
+        self._pruned: dict[
+            str, tuple[list[dict[str, t.Any]], dict[str, t.Any]]
+        ] = {}
+        self._seen: set[str] = set()
+        self._deleted_props: set[str] = set()
+        self.deletions: list[dict[str, t.Any]] = []
+        self.kept_props: dict[str, dict[str, t.Any]] = {}
+        self.refs: set[str] = set()
+        self.changed = 0
+
+    def add_package(
+        self, pkg_def: data_model.MessagePkgDef, pkg_yml: dict[str, t.Any]
+    ) -> None:
+        current = self._table.packages.get(pkg_def.name)
+        pkg_sync = pkg_yml.get("sync", {})
+        if current is None:
+            for cls_yml in pkg_sync.get("classes", []):
+                self._keep_properties(cls_yml["sync"]["properties"])
+            self._packages.append((pkg_yml, None, []))
+            return
+
+        classes: list[dict[str, t.Any]] = []
+        enums: list[dict[str, t.Any]] = []
+        cls_ymls = iter(pkg_sync.get("classes", []))
+        enum_ymls = iter(pkg_sync.get("enumerations", []))
+        for msg_def in pkg_def.messages:
+            if msg_def.fields:
+                self._add_class(current, msg_def, next(cls_ymls), classes)
+            for enum_def in msg_def.enums:
+                self._add_enum(current, enum_def, next(enum_ymls), enums)
+        self._packages.append((pkg_yml, classes, enums))
+
+    def _keep_properties(self, prop_ymls: list[dict[str, t.Any]]) -> None:
+        for prop_yml in prop_ymls:
+            self.kept_props[prop_yml["promise_id"]] = prop_yml
+
+    def _add_class(
+        self,
+        current: _ModelPackage,
+        msg_def: data_model.MessageDef,
+        cls_yml: dict[str, t.Any],
+        classes: list[dict[str, t.Any]],
+    ) -> None:
+        cls_current = current.classes.get(msg_def.name)
+        if cls_current is None:
+            self._keep_properties(cls_yml["sync"]["properties"])
+            classes.append(cls_yml)
+            self.changed += 1
+            return
+
+        props = [
+            prop_yml
+            for field_def, prop_yml in zip(
+                msg_def.fields, cls_yml["sync"]["properties"], strict=True
+            )
+            if self._property_changed(
+                current,
+                cls_current.members.get(field_def.name),
+                field_def,
+                prop_yml,
+            )
+        ]
+        self._keep_properties(props)
+        self._delete_members(
+            cls_current,
+            {field_def.name for field_def in msg_def.fields},
+            "owned_properties",
+        )
+        self._add_element(
+            classes,
+            cls_yml,
+            "properties",
+            props,
+            _changed(cls_current, msg_def.description),
+        )
+
+    def _property_changed(
+        self,
+        current: _ModelPackage,
+        prop_current: _ModelMember | None,
+        field_def: data_model.FieldDef,
+        prop_yml: dict[str, t.Any],
+    ) -> bool:
+        if prop_current is None:
+            return True
+        type_key, kind = self._expected_type(
+            prop_yml["set"]["type"].identifier
+        )
+        if kind != "UNSET" and prop_current.uuid not in current.associations:
+            return True
+        return prop_current.state != (
+            type_key,
+            kind,
+            field_def.type.card.min,
+            field_def.type.card.max,
+        ) or _changed(prop_current, field_def.description)
+
+    def _add_enum(
+        self,
+        current: _ModelPackage,
+        enum_def: data_model.EnumDef,
+        enum_yml: dict[str, t.Any],
+        enums: list[dict[str, t.Any]],
+    ) -> None:
+        enum_current = current.enumerations.get(enum_def.name)
+        if enum_current is None:
+            enums.append(enum_yml)
+            self.changed += 1
+            return
+
+        literals = []
+        for literal, literal_yml in zip(
+            enum_def.literals, enum_yml["sync"]["literals"], strict=True
+        ):
+            literal_current = enum_current.members.get(literal.name)
+            if (
+                literal_current is None
+                or literal_current.state != (str(literal.value),)
+                or _changed(literal_current, literal.description)
+            ):
+                literals.append(literal_yml)
+        self._delete_members(
+            enum_current,
+            {literal.name for literal in enum_def.literals},
+            "owned_literals",
+        )
+        self._add_element(
+            enums,
+            enum_yml,
+            "literals",
+            literals,
+            _changed(enum_current, enum_def.description),
+        )
+
+    def _delete_members(
+        self, element: _ModelElement, names: set[str], attr: str
+    ) -> None:
+        if element.uuid in self._seen:
+            return
+        self._seen.add(element.uuid)
+        extra = [
+            member.uuid
+            for name, member in element.members.items()
+            if name not in names
+        ]
+        if extra:
+            if attr == "owned_properties":
+                self._deleted_props.update(extra)
+            self.deletions.append(_delete(element.uuid, {attr: extra}))
+
+    def _add_element(
+        self,
+        target: list[dict[str, t.Any]],
+        yml: dict[str, t.Any],
+        attr: str,
+        members: list[dict[str, t.Any]],
+        changed: bool,  # noqa: FBT001
+    ) -> None:
+        stub = {"promise_id": yml["promise_id"], "find": yml["find"]}
+        if members or changed:
+            target.append(stub | {"set": yml["set"], "sync": {attr: members}})
+            self.changed += 1
+        else:
+            self._pruned[stub["promise_id"]] = (target, stub)
+
+    def _delete_elements(
+        self, current: _ModelPackage, classes: set[str], enums: set[str]
+    ) -> None:
+        extra_classes = [
+            element
+            for name, element in current.classes.items()
+            if name not in classes
+        ]
+        self._deleted_props.update(
+            member.uuid
+            for element in extra_classes
+            for member in element.members.values()
+        )
+        deletions = {
+            "classes": [element.uuid for element in extra_classes],
+            "enumerations": [
+                element.uuid
+                for name, element in current.enumerations.items()
+                if name not in enums
+            ],
+            "owned_associations": sorted(
+                {
+                    uuid
+                    for prop_uuid, uuid in current.associations.items()
+                    if prop_uuid in self._deleted_props
+                }
+            ),
+        }
+        deletions = {k: v for k, v in deletions.items() if v}
+        if deletions:
+            self.deletions.insert(0, _delete(current.uuid, deletions))
+
+    def finish(
+        self, expected: cabc.Mapping[str, tuple[set[str], set[str]]]
+    ) -> list[dict[str, t.Any]]:
+        """Return the reduced package instructions.
+
+        Parameters
+        ----------
+        expected
+            The names of the classes and enumerations that the messages
+            define, by package name.
+        """
+        for prop_yml in self.kept_props.values():
+            promise_ref = prop_yml["set"]["type"].identifier
+            self.refs.add(promise_ref)
+            if promise_ref in self._pruned:
+                target, stub = self._pruned.pop(promise_ref)
+                target.append(stub)
+
+        for pkg_name, current in self._table.packages.items():
+            self._delete_elements(current, *expected[pkg_name])
+
+        packages = []
+        for pkg_yml, classes, enums in self._packages:
+            if classes is None:
+                packages.append(pkg_yml)
+                continue
+            pkg_sync = pkg_yml.get("sync", {})
+            sync: dict[str, t.Any] = {}
+            if classes:
+                sync["classes"] = classes
+            if enums:
+                sync["enumerations"] = enums
+            associations = [
+                association
+                for association in pkg_sync.get("owned_associations", [])
+                if association["find"]["navigable_members"][0].identifier
+                in self.kept_props
+            ]
+            if associations:
+                sync["owned_associations"] = associations
+            if pkg_sync.get("packages"):
+                sync["packages"] = pkg_sync["packages"]
+            if sync:
+                packages.append({"find": pkg_yml["find"], "sync": sync})
+        return packages
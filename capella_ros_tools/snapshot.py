@@ -0,0 +1,151 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+"""Pre-parsed snapshot of interface repositories."""
+
+from __future__ import annotations
+
+import collections.abc as cabc
+import gzip
+import json
+import pathlib
+import subprocess
+import typing as t
+
+from capella_ros_tools import data_model, discovery
+
+from . import logger
+
+SNAPSHOT_FORMAT = 1
+
+
+class Interface(t.NamedTuple):
+    """The parsed packages of an interface repository."""
+
+    url: str | None
+    commit: str | None
+    packages: list[data_model.MessagePkgDef]
+
+
+def parse_checkout(
+    name: str,
+    path: pathlib.Path,
+    url: str | None = None,
+    license_header: str | None = None,
+) -> Interface:
+    """Parse all message packages of a local repository checkout.
+
+    Parameters
+    ----------
+    name
+        Name of the repository, used for message folders directly in
+        its root.
+    path
+        Path to the checkout.
+    url
+        URL of the repository, as used by the importer.
+    license_header
+        License header to strip from the message files.
+    """
+    packages = [
+        data_model.MessagePkgDef(
+            folder.package,
+            list(
+                data_model.MessageDef.iter_from_files(
+                    folder.files, license_header
+                )
+            ),
+            [],
+        )
+        for folder in discovery.find_message_folders(name, path)
+    ]
+    result = subprocess.run(
+        ["git", "-C", str(path), "rev-parse", "HEAD"],
+        check=False,
+        capture_output=True,
+        text=True,
+    )
+    commit = result.stdout.strip() if result.returncode == 0 else None
+    return Interface(url, commit, packages)
+
+
+def dump(
+    path: pathlib.Path,
+    interfaces: cabc.Mapping[str, Interface],
+    license_header: str | None = None,
+) -> None:
+    """Write a snapshot of interface repositories to a file.
+
+    The snapshot is gzip compressed JSON. It records the format and
+    parser version, and the license header the messages were parsed
+    with, so that outdated snapshots are never used.
+    """
+    data = {
+        "format": SNAPSHOT_FORMAT,
+        "parser_version": data_model.PARSER_VERSION,
+        "license_header": license_header,
+        "interfaces": {
+            name: {
+                "url": interface.url,
+                "commit": interface.commit,
+                "packages": [pkg.to_dict() for pkg in interface.packages],
+            }
+            for name, interface in interfaces.items()
+        },
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as fp:
+        json.dump(data, fp, separators=(",", ":"), sort_keys=True)
+
+
+def load(
+    path: pathlib.Path, license_header: str | None = None
+) -> dict[str, Interface]:
+    """Load a snapshot of interface repositories.
+
+    Parameters
+    ----------
+    path
+        The snapshot file.
+    license_header
+        The license header that the importer strips from message files.
+        A snapshot parsed with a different header is not used.
+
+    Returns
+    -------
+    dict[str, Interface]
+        The interfaces in the snapshot by name. Empty if the snapshot
+        does not exist, or cannot be used with this version.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fp:
+            data = json.load(fp)
+        if (
+            data["format"] != SNAPSHOT_FORMAT
+            or data["parser_version"] != data_model.PARSER_VERSION
+        ):
+            logger.warning("Ignoring outdated interface snapshot %s", path)
+            return {}
+        if data["license_header"] != license_header:
+            logger.info(
+                "Not using interface snapshot %s, it was parsed with a"
+                " different license header",
+                path,
+            )
+            return {}
+        return {
+            name: Interface(
+                entry["url"],
+                entry["commit"],
+                [
+                    data_model.MessagePkgDef.from_dict(pkg)
+                    for pkg in entry["packages"]
+                ],
+            )
+            for name, entry in data["interfaces"].items()
+        }
+    except FileNotFoundError:
+        logger.warning("Interface snapshot %s does not exist", path)
+        return {}
+    except (OSError, ValueError, KeyError, TypeError) as err:
+        logger.warning("Ignoring broken interface snapshot %s: %s", path, err)
+        return {}
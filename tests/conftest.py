@@ -1,7 +1,12 @@
 # Copyright DB InfraGO AG and contributors
 # SPDX-License-Identifier: Apache-2.0
 
+import collections.abc as cabc
+import pathlib
+
 import pytest
+from capellambse import helpers
+from lxml import etree
 
 from capella_ros_tools.data_model import (
     ConstantDef,
@@ -13,6 +18,39 @@ from capella_ros_tools.data_model import (
 )
 
 
+def _fragment_package(model_path: pathlib.Path, pkg_uuid: str) -> None:
+    (capella,) = model_path.glob("*.capella")
+    tree = etree.parse(capella)
+    (pkg,) = tree.xpath("//*[@id=$id]", id=pkg_uuid)
+    fragment = f"{pkg.get('name', '').replace(' ', '')}.capellafragment"
+    pkg.addprevious(etree.Element(pkg.tag, href=f"{fragment}#{pkg_uuid}"))
+    pkg.getparent().remove(pkg)
+    prefix, _, tag = pkg.get(helpers.ATT_XT, "").partition(":")
+    nsmap = tree.getroot().nsmap
+    root = etree.Element(etree.QName(nsmap[prefix], tag), nsmap=nsmap)
+    root.attrib.update(
+        (k, v) for k, v in pkg.attrib.items() if k != helpers.ATT_XT
+    )
+    root.extend(pkg.iterchildren())
+    etree.ElementTree(root).write(
+        model_path / fragment, encoding="utf-8", xml_declaration=True
+    )
+    tree.write(capella, encoding="utf-8", xml_declaration=True)
+
+    (aird,) = model_path.glob("*.aird")
+    tree = etree.parse(aird)
+    resource = etree.Element("semanticResources")
+    resource.text = fragment
+    tree.xpath("//semanticResources")[-1].addnext(resource)
+    tree.write(aird, encoding="utf-8", xml_declaration=True)
+
+
+@pytest.fixture
+def fragment_package() -> cabc.Callable[[pathlib.Path, str], None]:
+    """Move a data package of a model on disk into its own fragment."""
+    return _fragment_package
+
+
 @pytest.fixture
 def sample_class_def() -> MessageDef:
     return MessageDef(
@@ -0,0 +1,232 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import pathlib
+import re
+import shutil
+import subprocess
+
+import pytest
+from capellambse import decl, helpers
+
+from capella_ros_tools import importer
+from capella_ros_tools.cache import DependencyCache, ParseCache
+from capella_ros_tools.data_model import MessageDef, MessagePkgDef
+from capella_ros_tools.importer import Importer
+
+PATH = pathlib.Path(__file__).parent
+
+SAMPLE_PACKAGE_PATH = PATH.joinpath("data/data_model/example_msgs")
+SAMPLE_PACKAGE_PATH1 = SAMPLE_PACKAGE_PATH.joinpath("package1")
+SAMPLE_PACKAGE_YAML = PATH.joinpath("data/data_model/example_msgs.yaml")
+SAMPLE_CLASS_PATH = SAMPLE_PACKAGE_PATH1.joinpath("msg/SampleClass.msg")
+
+ROOT = helpers.UUIDString("00000000-0000-0000-0000-000000000000")
+SA_ROOT = helpers.UUIDString("00000000-0000-0000-0000-000000000001")
+
+
+def test_MessageDef_dict_roundtrip() -> None:
+    msg_def = MessageDef.from_file(SAMPLE_CLASS_PATH)
+
+    actual = MessageDef.from_dict(msg_def.to_dict())
+
+    assert actual == msg_def
+    assert actual.fields == msg_def.fields
+
+
+def test_MessagePkgDef_dict_roundtrip() -> None:
+    pkg_def = MessagePkgDef(
+        "root",
+        [],
+        [MessagePkgDef.from_msg_folder("pkg", SAMPLE_PACKAGE_PATH1)],
+    )
+
+    actual = MessagePkgDef.from_dict(pkg_def.to_dict())
+
+    assert actual == pkg_def
+    assert actual.packages[0].messages == pkg_def.packages[0].messages
+
+
+def test_key_depends_on_parser_inputs() -> None:
+    text = "uint8 field"
+    key = ParseCache.key("Msg", text)
+
+    assert ParseCache.key("Msg", text) == key
+    assert ParseCache.key("Other", text) != key
+    assert ParseCache.key("Msg", text + "\nuint8 other") != key
+    assert ParseCache.key("Msg", text, "# header\n") != key
+    assert ParseCache.key("Msg", text, None, re.compile("(.*)")) != key
+
+
+def test_from_msg_folder_uses_cache(tmp_path: pathlib.Path) -> None:
+    cache = ParseCache(tmp_path)
+    expected = MessagePkgDef.from_msg_folder("", SAMPLE_PACKAGE_PATH1)
+
+    first = MessagePkgDef.from_msg_folder(
+        "", SAMPLE_PACKAGE_PATH1, cache=cache
+    )
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    second = MessagePkgDef.from_msg_folder(
+        "", SAMPLE_PACKAGE_PATH1, cache=cache
+    )
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    assert first == expected
+    assert second == expected
+
+
+def test_broken_entry_is_a_miss(tmp_path: pathlib.Path) -> None:
+    cache = ParseCache(tmp_path)
+    key = ParseCache.key("Msg", "uint8 field")
+    cache.put(key, MessageDef.from_string("Msg", "uint8 field"))
+    next(tmp_path.rglob("*.json")).write_text("{", encoding="utf-8")
+
+    assert cache.get(key) is None
+    assert cache.misses == 1
+
+
+def test_cached_import_is_identical(tmp_path: pathlib.Path) -> None:
+    expected = decl.dump(decl.load(SAMPLE_PACKAGE_YAML))
+    Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=True,
+        cache=ParseCache(tmp_path),
+    )
+    cache = ParseCache(tmp_path)
+
+    actual = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True, cache=cache
+    ).to_yaml(ROOT, SA_ROOT)
+
+    assert actual == expected
+    assert cache.misses == 0
+    assert cache.hits > 0
+
+
+def _git(repo: pathlib.Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-C", str(repo), *args],
+        check=True,
+        capture_output=True,
+        text=True,
+        env={
+            "GIT_AUTHOR_NAME": "test",
+            "GIT_AUTHOR_EMAIL": "test@example.com",
+            "GIT_COMMITTER_NAME": "test",
+            "GIT_COMMITTER_EMAIL": "test@example.com",
+            "PATH": "/usr/bin:/bin",
+        },
+    ).stdout.strip()
+
+
+def _commit_interface(repo: pathlib.Path, text: str) -> str:
+    msg_dir = repo / "test_msgs/msg"
+    msg_dir.mkdir(parents=True, exist_ok=True)
+    (msg_dir / "Dependency.msg").write_text(text, "utf-8")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "update")
+    return _git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def interface_repo(tmp_path: pathlib.Path) -> pathlib.Path:
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    _commit_interface(repo, "uint8 first\n")
+    return repo
+
+
+def _dependency_fields(importer: Importer) -> list[str]:
+    (pkg_def,) = [
+        p for p in importer.messages.packages if p.name == "test_msgs"
+    ]
+    return [f.name for f in pkg_def.messages[0].fields]
+
+
+def test_dependency_cache_and_lockfile(
+    tmp_path: pathlib.Path, interface_repo: pathlib.Path
+) -> None:
+    interfaces = {"test_interfaces": f"git+file://{interface_repo}"}
+    lockfile = tmp_path / "lock.json"
+    first_commit = _git(interface_repo, "rev-parse", "HEAD")
+    cache = DependencyCache(tmp_path / "cache")
+    Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=False,
+        interfaces=interfaces,
+        dependency_cache=cache,
+        lockfile=lockfile,
+    )
+    _commit_interface(interface_repo, "uint8 second\n")
+
+    cache = DependencyCache(tmp_path / "cache")
+    pinned = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=False,
+        interfaces=interfaces,
+        dependency_cache=cache,
+        lockfile=lockfile,
+    )
+    unpinned = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=False,
+        interfaces=interfaces,
+        dependency_cache=cache,
+    )
+
+    locked = json.loads(lockfile.read_text("utf-8"))["interfaces"]
+    assert locked["test_interfaces"]["commit"] == first_commit
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert _dependency_fields(pinned) == ["first"]
+    assert _dependency_fields(unpinned) == ["second"]
+
+
+def test_unpinned_dependency_is_not_resolved(
+    monkeypatch: pytest.MonkeyPatch, interface_repo: pathlib.Path
+) -> None:
+    def fail(url: str) -> str:
+        raise AssertionError(f"Resolved the commit of {url}")
+
+    monkeypatch.setattr(importer, "_resolve_commit", fail)
+
+    actual = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=False,
+        interfaces={"test_interfaces": f"git+file://{interface_repo}"},
+    )
+
+    assert _dependency_fields(actual) == ["first"]
+
+
+def test_offline_mode(
+    tmp_path: pathlib.Path, interface_repo: pathlib.Path
+) -> None:
+    interfaces = {"test_interfaces": f"git+file://{interface_repo}"}
+    expected = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=False,
+        interfaces=interfaces,
+        dependency_cache=DependencyCache(tmp_path / "cache"),
+    ).messages
+    shutil.rmtree(interface_repo)
+
+    actual = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=False,
+        interfaces=interfaces,
+        dependency_cache=DependencyCache(tmp_path / "cache"),
+        offline=True,
+    ).messages
+
+    assert actual == expected
+    with pytest.raises(ValueError, match="offline"):
+        Importer(
+            SAMPLE_PACKAGE_PATH.as_posix(),
+            no_deps=False,
+            interfaces=interfaces,
+            dependency_cache=DependencyCache(tmp_path / "other"),
+            offline=True,
+        )
@@ -1,6 +1,8 @@
 # Copyright DB InfraGO AG and contributors
 # SPDX-License-Identifier: Apache-2.0
 
+import concurrent.futures
+import io
 import pathlib
 
 import pytest
@@ -303,6 +305,23 @@ uint8 field     # This is an inline comment.
 
         assert msg_def == expected
 
+    @staticmethod
+    def test_parse_comments_long_inline_comment() -> None:
+        lines = ["uint8 field     # line 0"]
+        lines.extend(f"                # line {i}" for i in range(1, 1000))
+        msg_def = MessageDef.from_string("test_name", "\n".join(lines))
+        expected = "".join(f"line {i} " for i in range(1000))
+
+        assert msg_def.fields[0].description == expected
+
+    @staticmethod
+    def test_parse_comments_indented_comment_before_first_field() -> None:
+        msg_string = """    # This comment has no element to attach to.
+uint8 field"""
+        msg_def = MessageDef.from_string("test_name", msg_string)
+
+        assert msg_def.fields[0].description == ""
+
 
 class TestMergeEnumDef:
     @staticmethod
@@ -623,6 +642,48 @@ def test_MessageDef_class_enum(sample_class_enum_def: MessageDef) -> None:
     assert msg_def == expected
 
 
+def test_MessageDef_str() -> None:
+    uint8 = TypeDef("uint8", Range("1", "1"))
+    msg_def = MessageDef(
+        "MyMessage",
+        [
+            FieldDef(uint8, "field_a", "<p>Field A</p>"),
+            FieldDef(TypeDef("float64", Range("0", "*")), "field_b", ""),
+        ],
+        [
+            EnumDef(
+                "MyEnum",
+                [
+                    ConstantDef(uint8, "A", "0", "<b>Literal</b> A"),
+                    ConstantDef(uint8, "B", "1", ""),
+                ],
+                "An <i>enum</i>",
+            ),
+            EnumDef("Other", [ConstantDef(uint8, "C", "2", "")], ""),
+        ],
+        "<p>A message</p>",
+    )
+    expected = (
+        "# A message\n"
+        "\n"
+        "# An enum\n"
+        "uint8 A = 0    # Literal A\n"
+        "uint8 B = 1\n"
+        "\n"
+        "\n"
+        "uint8 C = 2\n"
+        "\n"
+        "uint8 field_a    # Field A\n"
+        "float64[] field_b\n"
+    )
+    buffer = io.StringIO()
+
+    msg_def.write_to(buffer)
+
+    assert str(msg_def) == expected
+    assert buffer.getvalue() == expected
+
+
 @pytest.mark.parametrize(
     "msg_pkg_path",
     [
@@ -636,3 +697,127 @@ def test_MessagePkgDef_from_msg_folder(
     message_pkg_def = MessagePkgDef.from_msg_folder("", msg_pkg_path)
 
     assert message_pkg_def.messages
+
+
+def test_MessagePkgDef_from_msg_folder_with_executor() -> None:
+    expected = MessagePkgDef.from_msg_folder("", SAMPLE_PACKAGE_PATH1)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        actual = MessagePkgDef.from_msg_folder(
+            "", SAMPLE_PACKAGE_PATH1, executor=executor
+        )
+
+    assert [m.name for m in actual.messages] == [
+        m.name for m in expected.messages
+    ]
+    assert actual == expected
+
+
+def test_MessagePkgDef_iter_messages_is_lazy() -> None:
+    expected = MessagePkgDef.from_msg_folder("", SAMPLE_PACKAGE_PATH1)
+
+    messages = MessagePkgDef.iter_messages(SAMPLE_PACKAGE_PATH1)
+
+    assert next(messages) == expected.messages[0]
+    assert list(messages) == expected.messages[1:]
+
+
+def test_TypeDef_from_string_is_interned() -> None:
+    type_def = TypeDef.from_string("float64[]")
+
+    assert TypeDef.from_string("float64[]") is type_def
+    assert TypeDef.interned("float64", Range("0", "*")) is type_def
+    assert TypeDef.from_dict(type_def.to_dict()) is type_def
+
+
+def test_enum_renaming_does_not_modify_shared_types() -> None:
+    msg_string = """
+uint8 STATUS_OK = 0
+uint8 STATUS_ERROR = 1
+
+uint8 status
+uint8 other"""
+
+    msg_def = MessageDef.from_string("Msg", msg_string)
+
+    assert msg_def.fields[0].type == TypeDef("Status", Range("1", "1"), "Msg")
+    assert msg_def.fields[1].type is TypeDef.from_string("uint8")
+    assert TypeDef.from_string("uint8") == TypeDef("uint8", Range("1", "1"))
+
+
+def test_MessagePkgDef_structural_equality() -> None:
+    pkg_def = MessagePkgDef.from_msg_folder("pkg", SAMPLE_PACKAGE_PATH1)
+    reparsed = MessagePkgDef.from_msg_folder("pkg", SAMPLE_PACKAGE_PATH1)
+    reordered = MessagePkgDef("pkg", pkg_def.messages[::-1], [])
+    renamed = MessagePkgDef.from_msg_folder("other", SAMPLE_PACKAGE_PATH1)
+
+    assert reparsed is not pkg_def
+    assert reparsed == pkg_def
+    assert reordered == pkg_def
+    assert renamed != pkg_def
+    assert len({pkg_def, reparsed, reordered, renamed}) == 2
+
+
+def test_MessageDef_equality_is_symmetric() -> None:
+    msg_def = MessageDef.from_string("Msg", "uint8 a\nuint8 b")
+    subset = MessageDef.from_string("Msg", "uint8 a")
+
+    assert msg_def != subset
+    assert subset != msg_def
+    assert hash(msg_def) == hash(
+        MessageDef.from_string("Msg", "uint8 a\nuint8 b")
+    )
+
+
+def test_MessagePkgDef_checksums() -> None:
+    def tree(inner: str) -> MessagePkgDef:
+        return MessagePkgDef(
+            "root",
+            [],
+            [
+                MessagePkgDef(
+                    "pkg",
+                    [
+                        MessageDef.from_string("Inner", inner),
+                        MessageDef.from_string(
+                            "Outer", "# Comment\nInner[] inner\nuint8 b"
+                        ),
+                        MessageDef.from_string("Other", "uint8 a"),
+                    ],
+                    [],
+                )
+            ],
+        )
+
+    checksums = tree("uint8 a").checksums()
+    commented = tree("# A comment.\nuint8 a    # Inline.").checksums()
+    changed = tree("uint16 a").checksums()
+
+    assert set(checksums) == {"pkg/Inner", "pkg/Outer", "pkg/Other"}
+    assert checksums["pkg/Inner"] == checksums["pkg/Other"]
+    assert commented == checksums
+    assert changed["pkg/Inner"] != checksums["pkg/Inner"]
+    assert changed["pkg/Outer"] != checksums["pkg/Outer"]
+    assert changed["pkg/Other"] == checksums["pkg/Other"]
+
+
+def test_MessagePkgDef_checksums_qualify_enums_by_package() -> None:
+    def pkg(name: str, error: int) -> MessagePkgDef:
+        return MessagePkgDef(
+            name,
+            [
+                MessageDef.from_string(
+                    "Status", f"uint8 OK=0\nuint8 ERROR={error}"
+                ),
+                MessageDef.from_string("Holder", "uint8 status  # cf. Status"),
+            ],
+            [],
+        )
+
+    checksums = MessagePkgDef(
+        "root", [], [pkg("a", 1), pkg("b", 2)]
+    ).checksums()
+    alone = MessagePkgDef("root", [], [pkg("a", 1)]).checksums()
+
+    assert checksums["a/Holder"] != checksums["b/Holder"]
+    assert checksums["a/Holder"] == alone["a/Holder"]
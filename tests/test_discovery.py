@@ -0,0 +1,106 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import pathlib
+
+from capellambse import filehandler
+
+from capella_ros_tools import discovery
+
+PATH = pathlib.Path(__file__).parent
+
+SAMPLE_PACKAGE_PATH = PATH.joinpath("data/data_model/example_msgs")
+
+
+def _write(root: pathlib.Path, *paths: str) -> None:
+    for path in paths:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text("", "utf-8")
+
+
+def _summary(
+    folders: list[discovery.MessageFolder], root: pathlib.Path
+) -> list[tuple[str, list[str]]]:
+    return [
+        (
+            folder.package,
+            [
+                pathlib.Path(os.fspath(f)).relative_to(root).as_posix()
+                if pathlib.Path(os.fspath(f)).is_absolute()
+                else os.fspath(f)
+                for f in folder.files
+            ],
+        )
+        for folder in folders
+    ]
+
+
+def test_find_message_folders_prunes(tmp_path: pathlib.Path) -> None:
+    _write(
+        tmp_path,
+        "msg/Top.msg",
+        "src/a_msgs/package.xml",
+        "src/a_msgs/msg/A.msg",
+        "src/a_msgs/msg/nested/Nested.msg",
+        "src/a_msgs/msg/README.md",
+        "src/a_msgs/test/msg/Test.msg",
+        "src/b_msgs/msg/B.msg",
+        "src/ignored_msgs/COLCON_IGNORE",
+        "src/ignored_msgs/msg/Ignored.msg",
+        "src/vendor/c_msgs/msg/C.msg",
+        "build/a_msgs/msg/A.msg",
+        "install/share/a_msgs/msg/A.msg",
+        "log/msg/Log.msg",
+        ".git/msg/Git.msg",
+    )
+
+    actual = discovery.find_message_folders(
+        "root", tmp_path, (*discovery.DEFAULT_IGNORE, "src/vendor")
+    )
+
+    assert _summary(actual, tmp_path) == [
+        ("root", ["msg/Top.msg"]),
+        (
+            "a_msgs",
+            ["src/a_msgs/msg/A.msg", "src/a_msgs/msg/nested/Nested.msg"],
+        ),
+        ("b_msgs", ["src/b_msgs/msg/B.msg"]),
+    ]
+
+
+def test_find_message_folders_local_matches_generic() -> None:
+    handler = filehandler.get_filehandler(SAMPLE_PACKAGE_PATH.as_posix())
+
+    local = discovery.find_message_folders("root", SAMPLE_PACKAGE_PATH)
+    generic = discovery.find_message_folders("root", handler.rootdir)
+
+    assert _summary(local, SAMPLE_PACKAGE_PATH) == _summary(
+        generic, SAMPLE_PACKAGE_PATH
+    )
+    assert [f.package for f in local] == ["package1", "package2"]
+
+
+def test_find_message_folders_uses_ament_index(
+    tmp_path: pathlib.Path,
+) -> None:
+    _write(
+        tmp_path,
+        "share/a_msgs/msg/A.msg",
+        "share/a_msgs/msg/A.idl",
+        "share/a_msgs/srv/S.srv",
+        "share/b_msgs/msg/B.msg",
+        "share/unindexed_msgs/msg/Unindexed.msg",
+    )
+    index = tmp_path / discovery.AMENT_INDEX
+    index.mkdir(parents=True)
+    (index / "a_msgs").write_text("msg/A.idl\nmsg/A.msg\nsrv/S.srv\n", "utf-8")
+    (index / "b_msgs").write_text("msg/B.msg", "utf-8")
+    (index / "srv_only").write_text("srv/S.srv\n", "utf-8")
+
+    actual = discovery.find_message_folders("root", tmp_path)
+
+    assert _summary(actual, tmp_path) == [
+        ("a_msgs", ["share/a_msgs/msg/A.msg"]),
+        ("b_msgs", ["share/b_msgs/msg/B.msg"]),
+    ]
@@ -0,0 +1,200 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import collections.abc as cabc
+import json
+import os
+import pathlib
+import shutil
+import typing as t
+
+import capellambse
+import pytest
+
+import capella_ros_tools
+from capella_ros_tools import data_model, exporter
+
+PATH = pathlib.Path(__file__).parent
+
+MODEL_PATH = PATH.joinpath("data/melody_model_60")
+
+
+@pytest.fixture(scope="module")
+def model() -> capellambse.MelodyModel:
+    return capellambse.MelodyModel(MODEL_PATH)
+
+
+def _read_tree(path: pathlib.Path) -> dict[str, str]:
+    return {
+        p.relative_to(path).as_posix(): p.read_text("utf-8")
+        for p in sorted(path.rglob("*.msg"))
+    }
+
+
+def test_export_skips_unchanged_files(
+    model: capellambse.MelodyModel, tmp_path: pathlib.Path
+) -> None:
+    exporter.export(model.sa.data_package, tmp_path)
+    files = sorted(tmp_path.rglob("*.msg"))
+    for path in files:
+        os.utime(path, ns=(0, 0))
+    changed = files[0]
+    changed.write_text("modified", "utf-8")
+    os.utime(changed, ns=(0, 0))
+
+    exporter.export(model.sa.data_package, tmp_path)
+
+    assert files
+    assert changed.stat().st_mtime_ns != 0
+    assert changed.read_text("utf-8") != "modified"
+    assert all(p.stat().st_mtime_ns == 0 for p in files[1:])
+
+
+def test_export_parallel(
+    model: capellambse.MelodyModel, tmp_path: pathlib.Path
+) -> None:
+    exporter.export(model.sa.data_package, tmp_path / "serial")
+
+    exporter.export(model.sa.data_package, tmp_path / "parallel", jobs=4)
+
+    expected = _read_tree(tmp_path / "serial")
+    assert expected
+    assert _read_tree(tmp_path / "parallel") == expected
+
+
+def test_export_fragmented_package(
+    model: capellambse.MelodyModel,
+    tmp_path: pathlib.Path,
+    fragment_package: cabc.Callable[[pathlib.Path, str], None],
+) -> None:
+    fragmented_path = tmp_path / "model"
+    shutil.copytree(MODEL_PATH, fragmented_path)
+    pkg = model.sa.data_package.packages.by_name("Test Package")
+    fragment_package(fragmented_path, pkg.uuid)
+    fragmented = capellambse.MelodyModel(fragmented_path)
+    exporter.export(model.sa.data_package, tmp_path / "expected")
+
+    exporter.export(fragmented.sa.data_package, tmp_path / "actual")
+
+    expected = _read_tree(tmp_path / "expected")
+    assert "TestPackage/SuperClass.msg" in expected
+    assert _read_tree(tmp_path / "actual") == expected
+
+
+def test_export_manifest(tmp_path: pathlib.Path) -> None:
+    model = capellambse.MelodyModel(MODEL_PATH)
+    output = tmp_path / "output"
+    manifest = tmp_path / "manifest.json"
+    exporter.export(model.sa.data_package, output, manifest=manifest)
+    elements = json.loads(manifest.read_text("utf-8"))["elements"]
+    deleted = model.sa.data_package.classes[0]
+    deleted_path = output / elements[deleted.uuid]["path"]
+    kept = model.sa.data_package.classes[1]
+    kept_path = output / elements[kept.uuid]["path"]
+    kept_path.write_text("untouched", "utf-8")
+    model.sa.data_package.classes.remove(deleted)
+
+    exporter.export(model.sa.data_package, output, manifest=manifest)
+
+    assert not deleted_path.exists()
+    assert kept_path.read_text("utf-8") == "untouched"
+    elements = json.loads(manifest.read_text("utf-8"))["elements"]
+    assert deleted.uuid not in elements
+    assert set(_read_tree(output)) == {e["path"] for e in elements.values()}
+
+
+def test_export_manifest_keeps_files_outside_output(
+    tmp_path: pathlib.Path,
+) -> None:
+    model = capellambse.MelodyModel(MODEL_PATH)
+    output = tmp_path / "output"
+    manifest = tmp_path / "manifest.json"
+    outside = tmp_path / "outside.msg"
+    outside.write_text("keep", "utf-8")
+    manifest.write_text(
+        json.dumps(
+            {
+                "version": capella_ros_tools.__version__,
+                "elements": {
+                    "stale": {"path": "../outside.msg", "fingerprint": None},
+                    "no-path": {"fingerprint": None},
+                    "no-dict": "outside.msg",
+                },
+            }
+        ),
+        "utf-8",
+    )
+
+    exporter.export(model.sa.data_package, output, manifest=manifest)
+
+    assert outside.read_text("utf-8") == "keep"
+
+
+def _expected_definitions(
+    pkg: t.Any, path: pathlib.Path
+) -> cabc.Iterator[tuple[str, pathlib.Path, t.Any]]:
+    for cls_obj in pkg.classes:
+        fields = []
+        for prop_obj in cls_obj.owned_properties:
+            try:
+                card = data_model.Range(
+                    prop_obj.min_card.value, prop_obj.max_card.value
+                )
+            except AttributeError:
+                card = data_model.Range("1", "1")
+            fields.append(
+                data_model.FieldDef(
+                    data_model.TypeDef(prop_obj.type.name, card),
+                    prop_obj.name,
+                    prop_obj.description or "",
+                )
+            )
+        yield (
+            cls_obj.uuid,
+            path / f"{exporter._clean_name(cls_obj.name)}.msg",
+            data_model.MessageDef(
+                cls_obj.name, fields, [], cls_obj.description or ""
+            ),
+        )
+    for enum_obj in pkg.enumerations:
+        literals = []
+        for i, lit_obj in enumerate(enum_obj.owned_literals):
+            try:
+                type_name = lit_obj.value.type.name
+            except AttributeError:
+                type_name = "uint8"
+            try:
+                value = lit_obj.value.value
+            except AttributeError:
+                value = i
+            literals.append(
+                data_model.ConstantDef(
+                    data_model.TypeDef(type_name, data_model.Range("1", "1")),
+                    lit_obj.name,
+                    value,
+                    lit_obj.description or "",
+                )
+            )
+        yield (
+            enum_obj.uuid,
+            path / f"{exporter._clean_name(enum_obj.name)}.msg",
+            data_model.EnumDef(
+                enum_obj.name, literals, enum_obj.description or ""
+            ),
+        )
+    for pkg_obj in pkg.packages:
+        yield from _expected_definitions(
+            pkg_obj, path / exporter._clean_name(pkg_obj.name)
+        )
+
+
+@pytest.mark.parametrize("layer", ["oa", "la", "sa", "pa"])
+def test_export_table_matches_model(
+    model: capellambse.MelodyModel, tmp_path: pathlib.Path, layer: str
+) -> None:
+    pkg = getattr(model, layer).data_package
+    expected = list(_expected_definitions(pkg, tmp_path))
+
+    actual = exporter._collect_package(pkg, tmp_path)
+
+    assert [tuple(e) for e in actual] == expected
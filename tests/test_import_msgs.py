@@ -1,11 +1,20 @@
 # Copyright DB InfraGO AG and contributors
 # SPDX-License-Identifier: Apache-2.0
 
+import collections.abc as cabc
+import contextlib
+import io
+import os
 import pathlib
+import shutil
+import threading
+import typing as t
 
+import capellambse
 import pytest
 from capellambse import decl, helpers
 
+from capella_ros_tools import importer as importer_module
 from capella_ros_tools.data_model import (
     ConstantDef,
     EnumDef,
@@ -240,6 +249,391 @@ def test_convert_package() -> None:
     assert actual == expected
 
 
+def test_convert_package_parallel() -> None:
+    expected = decl.dump(decl.load(SAMPLE_PACKAGE_YAML))
+
+    actual = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True, jobs=2
+    ).to_yaml(ROOT, SA_ROOT)
+
+    assert actual == expected
+
+
+def _model_summary(
+    model: capellambse.MelodyModel,
+) -> tuple[list[tuple[str, str, str, str]], int]:
+    properties = sorted(
+        (cls.name, prop.name, prop.type.name, prop.kind.name)
+        for cls in model.search("Class")
+        for prop in cls.properties
+    )
+    return properties, len(model.search("Association"))
+
+
+def test_to_yaml_stream() -> None:
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    expected_model = capellambse.MelodyModel(DUMMY_PATH)
+    actual_model = capellambse.MelodyModel(DUMMY_PATH)
+    root_uuid = expected_model.la.data_package.uuid
+    types_parent_uuid = expected_model.sa.data_package.uuid
+    decl.apply(
+        expected_model,
+        io.StringIO(importer.to_yaml(root_uuid, types_parent_uuid)),
+    )
+    fp = io.StringIO()
+
+    importer.to_yaml_stream(fp, root_uuid, types_parent_uuid)
+    decl.apply(actual_model, io.StringIO(fp.getvalue()))
+
+    assert _model_summary(actual_model) == _model_summary(expected_model)
+    assert len(decl.load(io.StringIO(fp.getvalue()))) > 2
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_to_yaml_shards(tmp_path: pathlib.Path, jobs: int) -> None:
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    expected_model = capellambse.MelodyModel(DUMMY_PATH)
+    actual_model = capellambse.MelodyModel(DUMMY_PATH)
+    root_uuid = expected_model.la.data_package.uuid
+    types_parent_uuid = expected_model.sa.data_package.uuid
+    importer.apply(expected_model, root_uuid, types_parent_uuid)
+
+    shards = importer.to_yaml_shards(
+        tmp_path, root_uuid, types_parent_uuid, jobs=jobs
+    )
+    datatypes, *packages = shards
+    for shard in [datatypes, *reversed(packages)]:
+        decl.apply(actual_model, shard)
+
+    assert [p.name for p in shards] == [
+        "_datatypes.yaml",
+        "package1.yaml",
+        "package2.yaml",
+    ]
+    assert _model_summary(actual_model) == _model_summary(expected_model)
+    assert len(actual_model.search("Class")) == len(
+        expected_model.search("Class")
+    )
+
+
+def test_apply_batches_resume(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    shutil.copytree(DUMMY_PATH, tmp_path / "model")
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    expected_model = capellambse.MelodyModel(DUMMY_PATH)
+    root_uuid = expected_model.la.data_package.uuid
+    types_parent_uuid = expected_model.sa.data_package.uuid
+    importer.apply(expected_model, root_uuid, types_parent_uuid)
+    checkpoint = tmp_path / "checkpoint.json"
+    apply_instructions = importer_module._apply_instructions
+    applied: list[int] = []
+
+    def fail_third(*args: t.Any) -> t.Any:
+        applied.append(len(applied))
+        if len(applied) == 3:
+            raise RuntimeError("interrupted")
+        return apply_instructions(*args)
+
+    monkeypatch.setattr(importer_module, "_apply_instructions", fail_third)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        importer.apply_batches(
+            capellambse.MelodyModel(tmp_path / "model"),
+            root_uuid,
+            types_parent_uuid,
+            checkpoint=checkpoint,
+        )
+    monkeypatch.undo()
+    model = capellambse.MelodyModel(tmp_path / "model")
+
+    timings = importer.apply_batches(
+        model, root_uuid, types_parent_uuid, checkpoint=checkpoint, resume=True
+    )
+
+    assert [timing.name for timing in timings] == ["package2"]
+    assert _model_summary(model) == _model_summary(expected_model)
+
+
+def test_apply() -> None:
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    expected_model = capellambse.MelodyModel(DUMMY_PATH)
+    actual_model = capellambse.MelodyModel(DUMMY_PATH)
+    root_uuid = expected_model.la.data_package.uuid
+    types_parent_uuid = expected_model.sa.data_package.uuid
+    yml = importer.to_yaml(root_uuid, types_parent_uuid)
+    decl.apply(expected_model, io.StringIO(yml))
+
+    importer.apply(actual_model, root_uuid, types_parent_uuid)
+
+    assert _model_summary(actual_model) == _model_summary(expected_model)
+    assert importer.to_yaml(root_uuid, types_parent_uuid) == yml
+
+
+def test_apply_falls_back_to_yaml(monkeypatch: pytest.MonkeyPatch) -> None:
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    expected_model = capellambse.MelodyModel(DUMMY_PATH)
+    actual_model = capellambse.MelodyModel(DUMMY_PATH)
+    root_uuid = expected_model.la.data_package.uuid
+    types_parent_uuid = expected_model.sa.data_package.uuid
+    yml = importer.to_yaml(root_uuid, types_parent_uuid)
+    decl.apply(expected_model, io.StringIO(yml))
+    monkeypatch.setattr(
+        importer_module,
+        "_instruction_loader",
+        lambda _: contextlib.nullcontext(),
+    )
+
+    importer.apply(actual_model, root_uuid, types_parent_uuid)
+
+    assert _model_summary(actual_model) == _model_summary(expected_model)
+
+
+def test_apply_restores_decl_loader() -> None:
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    model = capellambse.MelodyModel(DUMMY_PATH)
+    original = decl.load_with_metadata
+
+    importer.apply(
+        model, model.la.data_package.uuid, model.sa.data_package.uuid
+    )
+
+    assert decl.load_with_metadata is original
+
+
+def test_diff_follows_fragments(
+    tmp_path: pathlib.Path,
+    fragment_package: cabc.Callable[[pathlib.Path, str], None],
+) -> None:
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    model_path = tmp_path / "model"
+    shutil.copytree(DUMMY_PATH, model_path)
+    model = capellambse.MelodyModel(model_path)
+    root_uuid = model.la.data_package.uuid
+    types_parent_uuid = model.sa.data_package.uuid
+    importer.apply(model, root_uuid, types_parent_uuid)
+    model.save()
+    for pkg in model.la.data_package.packages:
+        fragment_package(model_path, pkg.uuid)
+    model = capellambse.MelodyModel(model_path)
+
+    actual = importer.to_yaml(root_uuid, types_parent_uuid, model=model)
+
+    assert len(model._loader.trees) > 4
+    assert actual == "[]\n"
+
+
+def test_apply_diff(tmp_path: pathlib.Path) -> None:
+    _write_msg(
+        tmp_path / "a_msgs/msg/Pose.msg",
+        "float64 x\nfloat64 y\nb_msgs/Status status\n",
+    )
+    _write_msg(tmp_path / "a_msgs/msg/Old.msg", "Pose pose\n")
+    _write_msg(
+        tmp_path / "b_msgs/msg/Status.msg",
+        "uint8 OK=0\nuint8 ERROR=1\nuint8 status\n",
+    )
+    model = capellambse.MelodyModel(DUMMY_PATH)
+    root_uuid = model.la.data_package.uuid
+    types_parent_uuid = model.sa.data_package.uuid
+    Importer(tmp_path.as_posix(), no_deps=True).apply(
+        model, root_uuid, types_parent_uuid
+    )
+    _write_msg(
+        tmp_path / "a_msgs/msg/Pose.msg", "float32 x\nb_msgs/Status s\n"
+    )
+    (tmp_path / "a_msgs/msg/Old.msg").unlink()
+    _write_msg(
+        tmp_path / "b_msgs/msg/Status.msg",
+        "uint8 OK=0\nuint8 ERROR=2\nuint8 status\n",
+    )
+    importer = Importer(tmp_path.as_posix(), no_deps=True)
+    expected_model = capellambse.MelodyModel(DUMMY_PATH)
+    importer.apply(expected_model, root_uuid, types_parent_uuid)
+
+    instructions = decl.load(
+        io.StringIO(
+            importer.to_yaml(root_uuid, types_parent_uuid, model=model)
+        )
+    )
+    importer.apply(model, root_uuid, types_parent_uuid, diff=True)
+
+    a_msgs, b_msgs = instructions[2]["sync"]["packages"]
+    assert [i.get("delete") and list(i["delete"]) for i in instructions] == [
+        ["classes", "owned_associations"],
+        ["owned_properties"],
+        None,
+        None,
+        None,
+    ]
+    assert [p["find"]["name"] for p in a_msgs["sync"]["classes"]] == ["Pose"]
+    assert [
+        p["find"]["name"]
+        for p in a_msgs["sync"]["classes"][0]["sync"]["properties"]
+    ] == ["x", "s"]
+    assert b_msgs["sync"]["classes"] == [
+        {"promise_id": "b_msgs.Status", "find": {"name": "Status"}}
+    ]
+    assert [
+        literal["find"]["name"]
+        for literal in b_msgs["sync"]["enumerations"][0]["sync"]["literals"]
+    ] == ["ERROR"]
+    assert _model_summary(model) == _model_summary(expected_model)
+    assert (
+        importer.to_yaml(root_uuid, types_parent_uuid, model=model) == "[]\n"
+    )
+
+
+def test_iter_packages() -> None:
+    importer = Importer(SAMPLE_PACKAGE_PATH.as_posix(), no_deps=True)
+    expected = [
+        (pkg_def.name, msg_def)
+        for pkg_def in importer.messages.packages
+        for msg_def in pkg_def.messages
+    ]
+
+    actual = list(Importer.iter_packages(SAMPLE_PACKAGE_PATH.as_posix()))
+
+    assert [(p, m.name) for p, m in actual] == [
+        (p, m.name) for p, m in expected
+    ]
+    assert actual == expected
+
+
+def _touch(path: pathlib.Path, text: str) -> None:
+    path.write_text(text, "utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_refresh(tmp_path: pathlib.Path) -> None:
+    shutil.copytree(SAMPLE_PACKAGE_PATH, tmp_path, dirs_exist_ok=True)
+    importer = Importer(tmp_path.as_posix(), no_deps=True)
+    importer.to_yaml(ROOT, SA_ROOT)
+    package1, package2 = importer.messages.packages
+    sample_class = tmp_path / "package1/msg/SampleClass.msg"
+    _touch(sample_class, sample_class.read_text("utf-8") + "uint8 extra\n")
+    (tmp_path / "package2/msg/SampleClassEnum.msg").unlink()
+    (tmp_path / "package3/msg").mkdir(parents=True)
+    _touch(tmp_path / "package3/msg/New.msg", "uint8 field\n")
+
+    changed = importer.refresh()
+    actual = importer.to_yaml(ROOT, SA_ROOT)
+
+    assert changed == ["package1", "package2", "package3"]
+    assert importer.messages.packages[0] is not package1
+    assert importer.messages.packages[1] is not package2
+    assert all(
+        a is b
+        for a, b in zip(
+            importer.messages.packages[0].messages[1:],
+            package1.messages[1:],
+            strict=True,
+        )
+    )
+    assert actual == Importer(tmp_path.as_posix(), no_deps=True).to_yaml(
+        ROOT, SA_ROOT
+    )
+
+
+def test_refresh_unchanged(tmp_path: pathlib.Path) -> None:
+    shutil.copytree(SAMPLE_PACKAGE_PATH, tmp_path, dirs_exist_ok=True)
+    importer = Importer(tmp_path.as_posix(), no_deps=True)
+    messages = importer.messages
+    expected = importer.to_yaml(ROOT, SA_ROOT)
+
+    changed = importer.refresh()
+
+    assert changed == []
+    assert importer.messages is messages
+    assert importer.to_yaml(ROOT, SA_ROOT) == expected
+
+
+def test_to_yaml_packages(tmp_path: pathlib.Path) -> None:
+    shutil.copytree(SAMPLE_PACKAGE_PATH, tmp_path, dirs_exist_ok=True)
+    model = capellambse.MelodyModel(DUMMY_PATH)
+    root_uuid = model.la.data_package.uuid
+    types_parent_uuid = model.sa.data_package.uuid
+    importer = Importer(tmp_path.as_posix(), no_deps=True)
+    decl.apply(
+        model, io.StringIO(importer.to_yaml(root_uuid, types_parent_uuid))
+    )
+    sample_class = tmp_path / "package1/msg/SampleClass.msg"
+    _touch(sample_class, sample_class.read_text("utf-8") + "int64 extra\n")
+    changed = importer.refresh()
+
+    yml = importer.to_yaml(root_uuid, types_parent_uuid, packages=changed)
+    decl.apply(model, io.StringIO(yml))
+
+    assert changed == ["package1"]
+    cls = model.search("Class").by_name("SampleClass")
+    assert cls.properties.by_name("extra").type.name == "int64"
+    assert len(model.search("Class")) == 2
+    assert "SampleClassEnum.Color" not in yml
+
+
+def _write_msg(path: pathlib.Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _touch(path, text)
+
+
+def test_lazy_deps(tmp_path: pathlib.Path) -> None:
+    interfaces = tmp_path / "interfaces"
+    _write_msg(
+        interfaces / "direct_msgs/msg/Direct.msg", "indirect_msgs/Indirect i\n"
+    )
+    _write_msg(interfaces / "indirect_msgs/msg/Indirect.msg", "uint8 value\n")
+    _write_msg(interfaces / "unused_msgs/msg/Unused.msg", "uint8 value\n")
+    workspace = tmp_path / "workspace"
+    _write_msg(workspace / "local/msg/Local.msg", "direct_msgs/Direct d\n")
+
+    importer = Importer(
+        workspace.as_posix(),
+        no_deps=False,
+        interfaces={"test_interfaces": interfaces.as_posix()},
+        lazy_deps=True,
+    )
+    loaded = [p.name for p in importer.messages.packages]
+    _write_msg(workspace / "local/msg/Other.msg", "unused_msgs/Unused u\n")
+    changed = importer.refresh()
+
+    assert loaded == ["local", "direct_msgs", "indirect_msgs"]
+    assert changed == ["local", "unused_msgs"]
+    assert [p.name for p in importer.messages.packages] == [
+        "local",
+        "direct_msgs",
+        "indirect_msgs",
+        "unused_msgs",
+    ]
+
+
+def test_dependencies_are_fetched_concurrently(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    interfaces = {}
+    for name in ("second", "first"):
+        _write_msg(
+            tmp_path / name / f"{name}_msgs/msg/Message.msg", "uint8 value\n"
+        )
+        interfaces[name] = (tmp_path / name).as_posix()
+    barrier = threading.Barrier(len(interfaces), timeout=10)
+    find_packages = Importer._find_packages
+
+    def wait_for_all(*args: t.Any) -> t.Any:
+        barrier.wait()
+        return find_packages(*args)
+
+    monkeypatch.setattr(Importer, "_find_packages", staticmethod(wait_for_all))
+
+    importer = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(), no_deps=False, interfaces=interfaces
+    )
+
+    assert [p.name for p in importer.messages.packages][-2:] == [
+        "second_msgs",
+        "first_msgs",
+    ]
+
+
 def test_custom_license_header() -> None:
     importer = Importer(
         CUSTOM_LICENSE_PACKAGE_PATH.as_posix(),
@@ -0,0 +1,64 @@
+# Copyright DB InfraGO AG and contributors
+# SPDX-License-Identifier: Apache-2.0
+
+import pathlib
+
+from capella_ros_tools import data_model, snapshot
+from capella_ros_tools.importer import Importer
+
+PATH = pathlib.Path(__file__).parent
+
+SAMPLE_PACKAGE_PATH = PATH.joinpath("data/data_model/example_msgs")
+MISSING_URL = "git+file:///nonexistent/interfaces"
+
+
+def test_snapshot_roundtrip(tmp_path: pathlib.Path) -> None:
+    interface = snapshot.parse_checkout(
+        "example_msgs", SAMPLE_PACKAGE_PATH, MISSING_URL
+    )
+    snapshot.dump(tmp_path / "snapshot.json.gz", {"example": interface})
+
+    actual = snapshot.load(tmp_path / "snapshot.json.gz")
+
+    assert [p.name for p in interface.packages] == ["package1", "package2"]
+    assert actual == {"example": interface}
+
+
+def test_snapshot_license_header_mismatch(tmp_path: pathlib.Path) -> None:
+    interface = snapshot.Interface(MISSING_URL, None, [])
+    snapshot.dump(tmp_path / "snapshot.json.gz", {"example": interface})
+
+    actual = snapshot.load(tmp_path / "snapshot.json.gz", "# header\n")
+
+    assert actual == {}
+
+
+def test_snapshot_missing(tmp_path: pathlib.Path) -> None:
+    assert snapshot.load(tmp_path / "snapshot.json.gz") == {}
+
+
+def test_importer_uses_snapshot(tmp_path: pathlib.Path) -> None:
+    interface = snapshot.Interface(
+        MISSING_URL,
+        "0" * 40,
+        [
+            data_model.MessagePkgDef(
+                "snapshot_msgs",
+                [data_model.MessageDef.from_string("Msg", "uint8 value")],
+                [],
+            )
+        ],
+    )
+    snapshot.dump(tmp_path / "snapshot.json.gz", {"example": interface})
+    lockfile = tmp_path / "lock.json"
+
+    importer = Importer(
+        SAMPLE_PACKAGE_PATH.as_posix(),
+        no_deps=False,
+        interfaces={"example": MISSING_URL},
+        snapshot_path=tmp_path / "snapshot.json.gz",
+        lockfile=lockfile,
+    )
+
+    assert importer.messages.packages[-1] == interface.packages[0]
+    assert '"commit": "' + "0" * 40 in lockfile.read_text("utf-8")